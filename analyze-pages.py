@@ -1,25 +1,26 @@
 import csv
 import re
 import os
-import bz2
 import cPickle
 import sys
+import hashlib
+import inspect
+import itertools
+import multiprocessing
+from optparse import OptionParser
 from collections import namedtuple, defaultdict
 from datetime import datetime
 from pprint import pprint
+from fileutil import replaceFile
+from pagestore import PageStore
+import specdata
+import resultsdb
+
+STORE = PageStore('scraped')
 
 TestRecord = namedtuple('TestRecord', 'testID tester machine cpu mhz hwAvail os compiler autoParallel benchType base peak')
 BenchRecord = namedtuple('BenchRecord', 'testID benchName base peak')
 
-def scanUntilLine(lineIter, pattern):
-    for line in lineIter:
-        m = re.search(pattern, line)
-        if m:
-            g = m.groups()
-            if len(g) == 1:
-                return g[0].strip()            
-            return [x.strip() for x in g]
-
 MHzExp = re.compile('[(/]?(\\d+(?:\\.\\d+)?)a? ?([mg]hz)\\)?')
 
 def ExtractMHzFromName(name):
@@ -31,54 +32,40 @@ def ExtractMHzFromName(name):
         value *= 1000
     return value
 
-def parse95(path):
-    testID = os.path.splitext(os.path.basename(path))[0]    
-    lineIter = iter(open(path))
-    for line in lineIter:
-        if line.startswith('   ------------  --------  --------  --------  --------  --------  --------'):
-            break
-        if 'SPEC has determined that this result was not in' in line:
-            return [], []
-    benches = []
-    for line in lineIter:
-        m = re.match('   (SPEC.{32}) ', line)
-        if m:
-            benchType = m.group(1).strip()
-            break
-        benchName = line[:15].strip()
-        base = line[35:45].strip()
-        peak = line[65:75].strip()
-        benches.append(BenchRecord(testID, benchName, base, peak))
-    if '_rate' in benchType:
-        return [], []
-    benchType = {
-        'SPECint_base95 (Geom. Mean)' : 'CINT95',
-        'SPECfp_base95 (Geom. Mean)' : 'CFP95'
-    }[benchType]
-    base = line[35:45].strip()
-    peak = lineIter.next()[65:75].strip()
-    properties = {}
-    label = ''
-    for line in lineIter:
-        l = line.strip()
-        if l in ['HARDWARE', 'SOFTWARE', 'TESTER INFORMATION', '------------------', '--------']:
-            continue
-        if l == 'NOTES':
-            break
-        if line[19:20] == ':':
-            label = line[:19].strip()
-        desc = line[21:].strip()
-        if label and desc:
-            if label in properties:
-                properties[label] += ' ' + desc
-            else:
-                properties[label] = desc
-    cpu = properties['CPU']
-    mhz = ExtractMHzFromName(cpu)
-    opSys = properties['Operating System']
-    compiler = properties['Compiler']
+
+#---------------------------------------------------------
+#  Result page formats
+#---------------------------------------------------------
+
+# Every result page is laid out as: a header, a separator line, one line per
+# benchmark, two summary (geometric mean) lines for base and peak, then a
+# block of "Label: description" properties. A PageFormat describes where
+# each of those lives for one SPEC suite.
+PageFormat = namedtuple('PageFormat', [
+    'pageExtension',    # only pages with this extension are parsed, if not None
+    'rejectFirstLine',  # marker which, on the first line, means there's no result
+    'headerLines',      # TestRecord field read from each leading line, or None to skip it
+    'headerFields',     # (field, pattern) pairs searched for in order, after headerLines
+    'separator',        # prefix of the line ending the header
+    'rejectPhrases',    # phrases in the header meaning the result was withdrawn
+    'summaryPattern',   # matches the base summary line, capturing the summary label
+    'rateMarker',       # summary labels containing this are rate results, which are skipped
+    'benchTypes',       # summary label -> benchType
+    'baseColumns',      # (start, end) of base ratios on benchmark and summary lines
+    'peakColumns',      # (start, end) of peak ratios
+    'sectionLines',     # lines of the property block which are ignored
+    'propertiesEnd',    # line which ends the property block
+    'labelColumn',      # column of the ':' following each property label
+    'properties',       # TestRecord field -> property label
+    'mhzProperty',      # (property label, function converting it to MHz)
+    'defaults',         # TestRecord fields which aren't on the page
+    'fixup',            # function(path, fields, properties) for quirks, or None
+    'fixupProperties',  # property labels which the fixup function reads
+])
+
+def fixup95(path, fields, properties):
     if 'Hardware Avail' not in properties:
-        html = open(path[:-4] + '.html').read()
+        html = STORE.read(path[:-4] + '.html')
         m = re.search('Hardware Avail:\\s+<TD align=left>([^\\s]+)\\s', html)
         hwAvail = m.group(1).strip()
         m = re.search('Tested By:\\s+<TD align=left>(.+)$', html, re.MULTILINE)
@@ -90,162 +77,522 @@ def parse95(path):
         hwAvail = datetime.strptime(hwAvail, '%b-%y').strftime('%b-%Y')
     except ValueError:
         pass
-    model = properties['Model Name']
-    
-    testRecord = TestRecord(testID, testedBy, model, cpu, mhz, hwAvail, opSys, compiler, 'No', benchType, base, peak)
-    return [testRecord], benches
+    fields['hwAvail'] = hwAvail
+    fields['tester'] = testedBy
 
+def fixup2006(path, fields, properties):
+    if fields['machine'].startswith(fields['tester']):
+        fields['machine'] = fields['machine'][len(fields['tester']):].strip()
 
-def parse2000(path):
-    testID = os.path.splitext(os.path.basename(path))[0]    
-    lineIter = iter(open(path))
-    lineIter.next()
-    hwAvail = scanUntilLine(lineIter, 'Hardware availability: (.*)')
-    tester = scanUntilLine(lineIter, 'Tester: (.*?) *Software availability')
-    for line in lineIter:
-        if line.startswith('   ========================================================================'):
-            break
-        if 'SPEC has determined that this result was not in' in line:
-            return [], []
-    benches = []
-    for line in lineIter:
-        m = re.match('   (SPEC.{24})    ', line)
-        if m:
-            benchType = m.group(1).strip()
-            break
-        benchName = line[:15].strip()
-        base = line[35:45].strip()
-        peak = line[65:75].strip()
-        benches.append(BenchRecord(testID, benchName, base, peak))
-    if '_rate_' in benchType:
-        return [], []
-    benchType = {
-        'SPECint_base2000' : 'CINT2000',
-        'SPECfp_base2000' : 'CFP2000'
-    }[benchType]
-    base = line[35:45].strip()
-    peak = lineIter.next()[65:75].strip()
-    properties = {}
-    label = ''
-    for line in lineIter:
-        l = line.strip()
-        if l in ['HARDWARE', 'SOFTWARE', '--------']:
-            continue
-        if l == 'NOTES':
-            break
-        if line[20:21] == ':':
-            label = line[:20].strip()
-        desc = line[22:].strip()
-        if label and desc:
-            if label in properties:
-                properties[label] += ' ' + desc
-            else:
-                properties[label] = desc
-    cpu = properties['CPU']
-    mhz = float(properties['CPU MHz'])
-    opSys = properties['Operating System']
-    compiler = properties['Compiler']
-    model = properties['Model Name']
-    
-    testRecord = TestRecord(testID, tester, model, cpu, mhz, hwAvail, opSys, compiler, 'No', benchType, base, peak)
-    return [testRecord], benches
+PAGE_FORMATS = {
+    'cpu95': PageFormat(
+        pageExtension='.asc',
+        rejectFirstLine=None,
+        headerLines=(),
+        headerFields=(),
+        separator='   ------------  --------  --------  --------  --------  --------  --------',
+        rejectPhrases=('SPEC has determined that this result was not in',),
+        summaryPattern='   (SPEC.{32}) ',
+        rateMarker='_rate',
+        benchTypes={
+            'SPECint_base95 (Geom. Mean)' : 'CINT95',
+            'SPECfp_base95 (Geom. Mean)' : 'CFP95'
+        },
+        baseColumns=(35, 45),
+        peakColumns=(65, 75),
+        sectionLines=('HARDWARE', 'SOFTWARE', 'TESTER INFORMATION', '------------------', '--------'),
+        propertiesEnd='NOTES',
+        labelColumn=19,
+        properties={'cpu': 'CPU', 'os': 'Operating System', 'compiler': 'Compiler', 'machine': 'Model Name'},
+        mhzProperty=('CPU', ExtractMHzFromName),
+        defaults={'autoParallel': 'No'},
+        fixup=fixup95,
+        fixupProperties=('Hardware Avail', 'Tested By')),
+    'cpu2000': PageFormat(
+        pageExtension=None,
+        rejectFirstLine=None,
+        headerLines=(None,),
+        headerFields=(('hwAvail', 'Hardware availability: (.*)'),
+                      ('tester', 'Tester: (.*?) *Software availability')),
+        separator='   ========================================================================',
+        rejectPhrases=('SPEC has determined that this result was not in',),
+        summaryPattern='   (SPEC.{24})    ',
+        rateMarker='_rate_',
+        benchTypes={
+            'SPECint_base2000' : 'CINT2000',
+            'SPECfp_base2000' : 'CFP2000'
+        },
+        baseColumns=(35, 45),
+        peakColumns=(65, 75),
+        sectionLines=('HARDWARE', 'SOFTWARE', '--------'),
+        propertiesEnd='NOTES',
+        labelColumn=20,
+        properties={'cpu': 'CPU', 'os': 'Operating System', 'compiler': 'Compiler', 'machine': 'Model Name'},
+        mhzProperty=('CPU MHz', float),
+        defaults={'autoParallel': 'No'},
+        fixup=None,
+        fixupProperties=()),
+    'cpu2006': PageFormat(
+        pageExtension=None,
+        rejectFirstLine='######################',
+        headerLines=(None, 'machine'),
+        headerFields=(('hwAvail', 'Hardware availability: (.*)'),
+                      ('tester', 'Tested by:    (.*?) *Software availability')),
+        separator='==============================================================================',
+        rejectPhrases=('SPEC has determined that this result was not in',
+                       'SPEC has determined that this result is not in'),
+        summaryPattern=' (SPEC.{27})  ',
+        rateMarker='_rate_',
+        benchTypes={
+            'SPECint(R)_base2006' : 'CINT2006',
+            'SPECfp(R)_base2006' : 'CFP2006',
+            'SPECint(R)_rate_base2006' : 'CINT2006',
+            'SPECfp(R)_rate_base2006' : 'CFP2006'
+        },
+        baseColumns=(33, 43),
+        peakColumns=(65, 75),
+        sectionLines=('HARDWARE', 'SOFTWARE', '--------'),
+        propertiesEnd='Submit Notes',
+        labelColumn=20,
+        properties={'cpu': 'CPU Name', 'os': 'Operating System', 'compiler': 'Compiler', 'autoParallel': 'Auto Parallel'},
+        mhzProperty=('CPU MHz', float),
+        defaults={},
+        fixup=fixup2006,
+        fixupProperties=()),
+}
 
 
-def parse2006(path):
-    testID = os.path.splitext(os.path.basename(path))[0]    
-    lineIter = iter(open(path))
-    if '######################' in lineIter.next():
-        return [], []
-    model = lineIter.next().strip()
-    hwAvail = scanUntilLine(lineIter, 'Hardware availability: (.*)')
-    tester = scanUntilLine(lineIter, 'Tested by:    (.*?) *Software availability')
-    if model.startswith(tester):
-        model = model[len(tester):].strip()
-    for line in lineIter:
-        if line.startswith('=============================================================================='):
-            break
-        if 'SPEC has determined that this result was not in' in line:
+#---------------------------------------------------------
+#  Result page scanner
+#---------------------------------------------------------
+#
+# The scanner works on byte offsets into the page buffer returned by the
+# page store, which reads straight out of the memory-mapped pack file.
+# Markers and fixed-width columns are tested in place, so only the fields
+# which end up in a TestRecord or BenchRecord are ever sliced into strings,
+# and nothing past the end of the property block is looked at.
+
+CompiledFormat = namedtuple('CompiledFormat', 'headerExps summaryExp sectionExp endExp wantedLabels')
+
+def compileFormat(fmt):
+    return CompiledFormat(
+        headerExps=[(field, re.compile(p)) for field, p in fmt.headerFields],
+        summaryExp=re.compile(fmt.summaryPattern),
+        sectionExp=re.compile('\\s*(?:%s)\\s*$' % '|'.join(map(re.escape, fmt.sectionLines))),
+        endExp=re.compile('\\s*%s\\s*$' % re.escape(fmt.propertiesEnd)),
+        wantedLabels=set(fmt.properties.values() + [fmt.mhzProperty[0]] + list(fmt.fixupProperties)))
+
+COMPILED_FORMATS = dict([(suite, compileFormat(fmt)) for suite, fmt in PAGE_FORMATS.iteritems()])
+
+def lineEnd(data, pos):
+    end = data.find('\n', pos)
+    return len(data) if end < 0 else end
+
+def field(data, pos, end, columns):
+    # Same as line[start:end].strip(), without slicing out the line.
+    start, stop = columns
+    return data[min(pos + start, end):min(pos + stop, end)].strip()
+
+def parseResultPage(suite, path):
+    # Scans the page once, top to bottom, following PAGE_FORMATS[suite].
+    fmt = PAGE_FORMATS[suite]
+    compiled = COMPILED_FORMATS[suite]
+    testID = os.path.splitext(os.path.basename(path))[0]
+    data = STORE.read(path)
+    size = len(data)
+    pos = 0
+    fields = dict(fmt.defaults)
+    for i, name in enumerate(fmt.headerLines):
+        end = lineEnd(data, pos)
+        if i == 0 and fmt.rejectFirstLine and data.find(fmt.rejectFirstLine, pos, end) >= 0:
             return [], []
-        if 'SPEC has determined that this result is not in' in line:
+        if name:
+            fields[name] = data[pos:end].strip()
+        pos = end + 1
+    headerPos = pos
+    for name, exp in compiled.headerExps:
+        # Patterns never span lines, so the first match is on the first
+        # matching line.
+        m = exp.search(data, pos)
+        if m:
+            fields[name] = m.group(1).strip()
+            pos = lineEnd(data, m.end()) + 1
+        else:
+            pos = size
+    sepPos = pos if data.startswith(fmt.separator, pos) else data.find('\n' + fmt.separator, pos) + 1
+    # Withdrawn results may have neither the header fields nor a separator.
+    for phrase in fmt.rejectPhrases:
+        if data.find(phrase, headerPos, sepPos if sepPos > 0 else size) >= 0:
             return [], []
+    if sepPos <= 0:
+        sys.stderr.write('Skipping %s: separator line not found\n' % path)
+        return [], []
+    pos = lineEnd(data, sepPos) + 1
+
+    # Benchmarks, up to the summary line.
     benches = []
-    for line in lineIter:
-        m = re.match(' (SPEC.{27})  ', line)
+    summaryLabel = None
+    while pos < size:
+        end = lineEnd(data, pos)
+        m = compiled.summaryExp.match(data, pos, end)
         if m:
-            benchType = m.group(1).strip()
+            summaryLabel = m.group(1).strip()
             break
-        benchName = line[:15].strip()
-        base = line[33:43].strip()
-        peak = line[65:75].strip()
-        benches.append(BenchRecord(testID, benchName, base, peak))
-    if '_rate_' in benchType:
+        benches.append(BenchRecord(testID, field(data, pos, end, (0, 15)),
+                                   field(data, pos, end, fmt.baseColumns),
+                                   field(data, pos, end, fmt.peakColumns)))
+        pos = end + 1
+    if summaryLabel is None:
+        raise ValueError('%s: summary line not found' % path)
+    if fmt.rateMarker in summaryLabel:
         return [], []
-    benchType = {
-        'SPECint(R)_base2006' : 'CINT2006',
-        'SPECfp(R)_base2006' : 'CFP2006',
-        'SPECint(R)_rate_base2006' : 'CINT2006',
-        'SPECfp(R)_rate_base2006' : 'CFP2006'
-    }[benchType]
-    base = line[33:43].strip()
-    peak = lineIter.next()[65:75].strip()
+    benchType = fmt.benchTypes[summaryLabel]
+    base = field(data, pos, end, fmt.baseColumns)
+    pos = end + 1
+    if pos >= size:
+        raise ValueError('%s: peak summary line not found' % path)
+    end = lineEnd(data, pos)
+    peak = field(data, pos, end, fmt.peakColumns)
+    pos = end + 1
+
+    # Properties. Only the descriptions of wanted labels are kept.
     properties = {}
     label = ''
-    for line in lineIter:
-        l = line.strip()
-        if l in ['HARDWARE', 'SOFTWARE', '--------']:
+    col = fmt.labelColumn
+    while pos < size:
+        end = lineEnd(data, pos)
+        if compiled.sectionExp.match(data, pos, end):
+            pos = end + 1
             continue
-        if l == 'Submit Notes':
+        if compiled.endExp.match(data, pos, end):
             break
-        if line[20:21] == ':':
-            label = line[:20].strip()
-        desc = line[22:].strip()
-        if label and desc:
-            if label in properties:
-                properties[label] += ' ' + desc
-            else:
-                properties[label] = desc
-    cpu = properties['CPU Name']
-    mhz = float(properties['CPU MHz'])
-    opSys = properties['Operating System']
-    compiler = properties['Compiler']
-    autoParallel = properties['Auto Parallel']
-    
-    testRecord = TestRecord(testID, tester, model, cpu, mhz, hwAvail, opSys, compiler, autoParallel, benchType, base, peak)
+        if pos + col < end and data[pos + col] == ':':
+            label = data[pos:pos + col].strip()
+        if label in compiled.wantedLabels:
+            desc = data[min(pos + col + 2, end):end].strip()
+            if desc:
+                if label in properties:
+                    properties[label] += ' ' + desc
+                else:
+                    properties[label] = desc
+        pos = end + 1
+    for name, label in fmt.properties.iteritems():
+        fields[name] = properties[label]
+    label, toMHz = fmt.mhzProperty
+    fields['mhz'] = toMHz(properties[label])
+    if fmt.fixup:
+        fmt.fixup(path, fields, properties)
+
+    testRecord = TestRecord(testID=testID, benchType=benchType, base=base, peak=peak, **fields)
     return [testRecord], benches
 
-def iterRecords():
+
+#---------------------------------------------------------
+#  Cache of parse results, so only new or changed pages are re-parsed
+#---------------------------------------------------------
+
+# Code shared by all page formats. If any of it changes, every cached
+# result is invalidated.
+PARSE_HELPERS = [compileFormat, lineEnd, field, parseResultPage]
+
+# Module-level values read by that code, which change the results just as
+# much as the code itself.
+PARSE_GLOBALS = [MHzExp.pattern, TestRecord._fields, BenchRecord._fields]
+
+def describe(value):
+    if inspect.isfunction(value):
+        return inspect.getsource(value)
+    if inspect.isbuiltin(value) or inspect.isclass(value):
+        return value.__name__
+    if isinstance(value, (tuple, list)):
+        return '(%s)' % ', '.join(map(describe, value))
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(['%r: %s' % (k, describe(v)) for k, v in sorted(value.items())])
+    return repr(value)
+
+def parserVersion(suite):
+    h = hashlib.sha1()
+    h.update(describe(PAGE_FORMATS[suite]))
+    for f in PARSE_HELPERS:
+        h.update(inspect.getsource(f))
+    h.update(repr(PARSE_GLOBALS))
+    return h.hexdigest()
+
+PARSER_VERSIONS = {}
+
+def pageKey(suite, path):
+    # Changes whenever the page, its .html sibling (read by fixup95) or the
+    # code parsing it changes.
+    if suite not in PARSER_VERSIONS:
+        PARSER_VERSIONS[suite] = parserVersion(suite)
+    return repr((STORE.stat(path), STORE.stat(path[:-4] + '.html'), PARSER_VERSIONS[suite]))
+
+class ParseCache:
+    # Append-only log of pickled parse results (<root>.dat), indexed by
+    # <root>.idx, which has one line per result: page path, page key, offset
+    # and length. Results are appended as pages are parsed, so they survive
+    # an interrupted run, and only the index is held in memory.
+    def __init__(self, root):
+        self.dataPath = root + '.dat'
+        self.indexPath = root + '.idx'
+        self.index = {}         # page path -> (key, offset, length)
+        self.used = set()
+        self.readFile = self.dataFile = self.indexFile = None
+        if os.path.exists(self.indexPath):
+            dataSize = os.path.getsize(self.dataPath) if os.path.exists(self.dataPath) else 0
+            with open(self.indexPath, 'rb') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) != 4:
+                        continue        # Torn write
+                    path, key, offset, length = fields
+                    offset, length = int(offset), int(length)
+                    if offset + length <= dataSize:
+                        self.index[path] = (key, offset, length)
+
+    def has(self, path, key):
+        entry = self.index.get(path)
+        return entry is not None and entry[0] == key
+
+    def get(self, path, key):
+        if not self.has(path, key):
+            return None
+        self.used.add(path)
+        key, offset, length = self.index[path]
+        if self.readFile is None:
+            self.readFile = open(self.dataPath, 'rb')
+        self.readFile.seek(offset)
+        tests, benches = cPickle.loads(self.readFile.read(length))
+        return [TestRecord._make(t) for t in tests], [BenchRecord._make(b) for b in benches]
+
+    def markUsed(self, path, key):
+        # For results used without being read, so close() keeps them.
+        if self.has(path, key):
+            self.used.add(path)
+
+    def put(self, path, key, result):
+        tests, benches = result
+        data = cPickle.dumps((map(tuple, tests), map(tuple, benches)), cPickle.HIGHEST_PROTOCOL)
+        if self.dataFile is None:
+            self.dataFile = open(self.dataPath, 'ab')
+            self.dataFile.seek(0, os.SEEK_END)
+            self.indexFile = open(self.indexPath, 'ab')
+        offset = self.dataFile.tell()
+        self.dataFile.write(data)
+        self.indexFile.write('%s\t%s\t%d\t%d\n' % (path, key, offset, len(data)))
+        self.index[path] = (key, offset, len(data))
+        self.used.add(path)
+
+    def flush(self):
+        # Data first, so the index never refers to data which isn't there.
+        if self.dataFile is not None:
+            self.dataFile.flush()
+            self.indexFile.flush()
+
+    def close(self):
+        # Rewrites the cache without the entries that weren't used by this
+        # run, such as deleted pages and outdated results, once they take up
+        # a quarter of it.
+        self.flush()
+        for f in [self.readFile, self.dataFile, self.indexFile]:
+            if f is not None:
+                f.close()
+        self.readFile = self.dataFile = self.indexFile = None
+        if not os.path.exists(self.dataPath):
+            return
+        usedBytes = sum([self.index[path][2] for path in self.used])
+        if usedBytes * 4 >= os.path.getsize(self.dataPath) * 3:
+            return
+        with open(self.dataPath, 'rb') as src:
+            with open(self.dataPath + '.tmp', 'wb') as data:
+                with open(self.indexPath + '.tmp', 'wb') as index:
+                    for path in sorted(self.used):
+                        key, offset, length = self.index[path]
+                        src.seek(offset)
+                        index.write('%s\t%s\t%d\t%d\n' % (path, key, data.tell(), length))
+                        data.write(src.read(length))
+        for path in [self.dataPath, self.indexPath]:
+            replaceFile(path + '.tmp', path)
+
+
+#---------------------------------------------------------
+#  Streaming export with checkpoints
+#---------------------------------------------------------
+
+class ExportFile:
+    # A CSV output written to <path>.partial, and renamed once complete.
+    # If resumeSize is given, the partial file is truncated to it and
+    # appended to; otherwise it's started over.
+    def __init__(self, path, fields, resumeSize=None):
+        self.path = path
+        self.partialPath = path + '.partial'
+        if resumeSize is None:
+            self.f = open(self.partialPath, 'wb')
+            self.writer = csv.writer(self.f)
+            self.writer.writerow(fields)
+        else:
+            self.f = open(self.partialPath, 'r+b')
+            self.f.truncate(resumeSize)
+            self.f.seek(0, os.SEEK_END)
+            self.writer = csv.writer(self.f)
+
+    def writeRows(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.f.flush()
+        return self.f.tell()
+
+    def finish(self):
+        self.f.close()
+        replaceFile(self.partialPath, self.path)
+
+class Checkpoint:
+    # Remembers how many pages have been exported, and the size of each
+    # output file at that point. It's only valid for the same list of pages,
+    # identified by listingKey.
+    def __init__(self, path, listingKey):
+        self.path = path
+        self.listingKey = listingKey
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0, None
+        with open(self.path, 'rb') as f:
+            fields = f.read().split()
+        if len(fields) < 2 or fields[0] != self.listingKey:
+            return 0, None
+        return int(fields[1]), map(int, fields[2:])
+
+    def save(self, pagesDone, sizes):
+        with open(self.path + '.tmp', 'wb') as f:
+            f.write(' '.join([self.listingKey, str(pagesDone)] + map(str, sizes)) + '\n')
+        replaceFile(self.path + '.tmp', self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+#---------------------------------------------------------
+#  Parse all pages
+#---------------------------------------------------------
+
+def parsePage(pair):
+    suite, path = pair
+    return parseResultPage(suite, path)
+
+def closeStore():
+    # Pool initializer. A module-level function, since bound methods can't be
+    # pickled for the processes Windows spawns.
+    STORE.close()
+
+def iterParsedPages(allTests, jobs):
+    # Yields the parse results in the same order as allTests, regardless of
+    # the number of jobs, so the output files are identical.
+    if jobs <= 1:
+        for result in itertools.imap(parsePage, allTests):
+            yield result
+        return
+    # Workers must not share the parent's open pack file handle.
+    pool = multiprocessing.Pool(jobs, initializer=closeStore)
+    chunkSize = max(1, min(64, len(allTests) // (jobs * 8)))
+    try:
+        for result in pool.imap(parsePage, allTests, chunkSize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def iterCachedPages(allTests, keys, jobs, cache):
+    # Only pages missing from the cache are sent to the parser workers.
+    if cache is None:
+        for result in iterParsedPages(allTests, jobs):
+            yield result
+        return
+    misses = [pair for pair, key in zip(allTests, keys) if not cache.has(pair[1], key)]
+    print '%d of %d pages found in the parse cache.' % (len(allTests) - len(misses), len(allTests))
+    parsed = iterParsedPages(misses, jobs)
+    for (suite, path), key in zip(allTests, keys):
+        result = cache.get(path, key)
+        if result is None:
+            result = parsed.next()
+            cache.put(path, key, result)
+        yield result
+
+def listPages():
     allTests = []
-    
-    for fn in os.listdir(os.path.join('scraped', 'cpu95')):
-        if fn.lower().endswith('.asc'):
-            allTests.append((parse95, os.path.join('scraped', 'cpu95', fn)))
-    for fn in os.listdir(os.path.join('scraped', 'cpu2000')):
-        allTests.append((parse2000, os.path.join('scraped', 'cpu2000', fn)))
-    for fn in os.listdir(os.path.join('scraped', 'cpu2006')):
-        allTests.append((parse2006, os.path.join('scraped', 'cpu2006', fn)))
-    
-    tests = []
-    benches = []
-    for i, pair in enumerate(allTests):
+    for suite in ['cpu95', 'cpu2000', 'cpu2006']:
+        ext = PAGE_FORMATS[suite].pageExtension
+        for fn in STORE.listdir(suite):
+            if ext is None or fn.lower().endswith(ext):
+                allTests.append((suite, suite + '/' + fn))
+    return allTests
+
+def iterRecords(jobs=1, cacheRoot=None, batchSize=500, dbPath=None):
+    allTests = listPages()
+    keys = [pageKey(suite, path) for suite, path in allTests]
+    listingKey = hashlib.sha1('\n'.join(['%s %s' % (path, key) for (suite, path), key in zip(allTests, keys)])).hexdigest()
+    checkpoint = Checkpoint('analyze.checkpoint', listingKey)
+    start, sizes = checkpoint.load()
+    paths = ['summaries.txt', 'benchmarks.txt']
+    if start and not all([os.path.exists(path + '.partial') and os.path.getsize(path + '.partial') >= size
+                          for path, size in zip(paths, sizes)]):
+        print 'The partial outputs of the interrupted run are missing or incomplete. Starting over ...'
+        start = 0
+    if start:
+        print 'Resuming from checkpoint after %d/%d pages ...' % (start, len(allTests))
+    else:
+        sizes = [None, None]
+    outputs = [ExportFile(paths[0], TestRecord._fields, sizes[0]),
+               ExportFile(paths[1], BenchRecord._fields, sizes[1])]
+    summaries, benchmarks = outputs
+
+    # Rows are written out as soon as each page is parsed. Every batchSize
+    # pages, the outputs and cache are flushed and a checkpoint is saved.
+    cache = ParseCache(cacheRoot) if cacheRoot else None
+    if cache is not None:
+        # The pages before the checkpoint aren't looked at again, but their
+        # cached results are still current.
+        for (suite, path), key in zip(allTests[:start], keys[:start]):
+            cache.markUsed(path, key)
+    results = iterCachedPages(allTests[start:], keys[start:], jobs, cache)
+    for i, (tests, benches) in enumerate(results, start):
         if i % 100 == 0:
             print 'Analyzing %d/%d ...' % (i, len(allTests))
-        func, arg = pair
-        t, b = func(arg)
-        tests += t
-        benches += b
-        
-    print 'Writing summaries.txt ...'
-    with open('summaries.txt', 'w') as f:
-        w = csv.writer(f)
-        w.writerow(TestRecord._fields)
-        for t in tests:
-            w.writerow(t)
-            
-    print 'Writing benchmarks.txt ...'
-    with open('benchmarks.txt', 'w') as f:
-        w = csv.writer(f)
-        w.writerow(BenchRecord._fields)
-        for b in benches:
-            w.writerow(b)
-            
-iterRecords()
+        summaries.writeRows(tests)
+        benchmarks.writeRows(benches)
+        if (i + 1) % batchSize == 0:
+            if cache is not None:
+                cache.flush()
+            checkpoint.save(i + 1, [f.flush() for f in outputs])
+    if cache is not None:
+        cache.close()
+
+    print 'Writing summaries.txt and benchmarks.txt ...'
+    for f in outputs:
+        f.finish()
+    checkpoint.remove()
+
+    print 'Writing dataset.bin ...'
+    dataset = specdata.readCsv('summaries.txt', 'benchmarks.txt')
+    specdata.save(dataset, 'dataset.bin')
+    if dbPath:
+        print 'Writing %s ...' % dbPath
+        resultsdb.build(dataset, dbPath)
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-j', '--jobs', type='int', default=multiprocessing.cpu_count(),
+                      help='number of worker processes parsing pages [default: %default]')
+    parser.add_option('--cache', default=os.path.join('scraped', 'parsecache'),
+                      help='base name of the files caching the parse results of each page [default: %default]')
+    parser.add_option('--no-cache', action='store_const', const=None, dest='cache',
+                      help='re-parse every page, without reading or writing the cache')
+    parser.add_option('--batch', type='int', default=500,
+                      help='pages between each flush of the outputs and checkpoint [default: %default]')
+    parser.add_option('--sqlite', metavar='PATH',
+                      help='also load the results into a SQLite database, e.g. results.db, for query-results.py')
+    options, args = parser.parse_args()
+    iterRecords(options.jobs, options.cache, options.batch, options.sqlite)
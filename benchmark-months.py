@@ -0,0 +1,51 @@
+import datetime
+import random
+import time
+import specdata
+
+#---------------------------------------------------------
+#  Compare datetime hardware dates against interned month indexes
+#---------------------------------------------------------
+#
+# Times the ways make-graphs.py has handled each result's hwAvail date:
+# parsing it with strptime for every row, then sorting and plotting
+# datetimes, versus parsing each distinct string once into an integer
+# month index, as specdata does, and working on plain ints.
+
+def timed(label, func, repeat=5):
+    best = min([timeOnce(func) for i in xrange(repeat)])
+    print '    %-50s %8.2f ms' % (label, best * 1000)
+    return best
+
+def timeOnce(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+tests = specdata.load().tests
+hwAvail = list(tests.hwAvail)
+scores = [random.random() for s in hwAvail]
+print '%d results, %d distinct hwAvail strings' % (len(hwAvail), len(tests.hwAvail.values))
+
+print 'Parsing:'
+def internedMonths():
+    table = map(specdata.monthIndex, tests.hwAvail.values)
+    return [table[c] for c in tests.hwAvail.codes]
+
+old = timed('strptime for every row', lambda: [datetime.datetime.strptime(s, '%b-%Y') for s in hwAvail])
+new = timed('monthIndex once per distinct string', internedMonths)
+print '    %.1fx faster' % (old / new)
+
+dates = [datetime.datetime.strptime(s, '%b-%Y') for s in hwAvail]
+months = [specdata.monthIndex(s) for s in hwAvail]
+print 'Sorting (date, score) pairs:'
+old = timed('datetime', lambda: sorted(zip(dates, scores)))
+new = timed('month index', lambda: sorted(zip(months, scores)))
+print '    %.1fx faster' % (old / new)
+
+minDate = datetime.datetime(1995, 1, 1)
+minMonth = specdata.monthIndex('Jan-1995')
+print 'Months since 1995, per point:'
+old = timed('datetime', lambda: [(d.year * 12 + d.month) - (minDate.year * 12 - minDate.month) for d in dates])
+new = timed('month index', lambda: [m - minMonth + 2 * (minMonth % 12 + 1) for m in months])
+print '    %.1fx faster' % (old / new)
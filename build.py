@@ -0,0 +1,81 @@
+import collections
+import os
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+import buildstate
+
+#---------------------------------------------------------
+#  Incremental build of the whole pipeline
+#---------------------------------------------------------
+#
+# Runs fetch-pages.py (only with --fetch), analyze-pages.py and
+# make-graphs.py in the current directory. A stage is skipped when its
+# inputs, its code and its outputs all have the same contents as after its
+# last run. make-graphs.py also gets --state, so when it does run, only the
+# INT or FP outputs whose results changed are redone.
+#
+# fetch-pages.py's input is spec.org itself, so it always runs when asked
+# to; it only downloads new and changed pages anyway.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+Stage = collections.namedtuple('Stage', 'name script args code inputs outputs')
+
+def stages(statePath, jobs, force):
+    pages = [os.path.join('scraped', 'pages.pack'), os.path.join('scraped', 'pages.idx')]
+    csvs = ['summaries.txt', 'benchmarks.txt', 'dataset.bin']
+    return [
+        Stage('fetch', 'fetch-pages.py', [],
+              ['fetch-pages.py', 'fetcher.py', 'pagestore.py', 'fileutil.py'],
+              None, pages),
+        Stage('analyze', 'analyze-pages.py', [],
+              ['analyze-pages.py', 'pagestore.py', 'specdata.py', 'resultsdb.py', 'cpus.py', 'fileutil.py'],
+              pages, csvs),
+        Stage('graphs', 'make-graphs.py', ([] if force else ['--state', statePath]) + ['-j', str(jobs)],
+              ['make-graphs.py', 'graphdata.py', 'rendergraph.py', 'cpus.py', 'scoring.py', 'specdata.py', 'buildstate.py', 'fileutil.py'],
+              csvs, ['identified_cpus.txt', 'int_report.txt', 'fp_report.txt', 'int_graph.png', 'fp_graph.png']),
+    ]
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('--fetch', action='store_true',
+                      help='first sync the result pages from spec.org with fetch-pages.py')
+    parser.add_option('--force', action='store_true',
+                      help='run every stage, even if it is up to date')
+    parser.add_option('-j', '--jobs', type='int', default=1,
+                      help='passed on to make-graphs.py [default: %default]')
+    parser.add_option('--state', default='build-state.txt',
+                      help='file recording the fingerprints of the last build [default: %default]')
+    options, args = parser.parse_args()
+
+    start = time.time()
+    state = buildstate.BuildState(options.state)
+    for stage in stages(options.state, options.jobs, options.force):
+        if stage.inputs is None and not options.fetch:
+            continue
+        missing = [fn for fn in stage.inputs or [] if not os.path.exists(fn)]
+        if missing and stage.name == 'analyze':
+            # Without any pages, analyze-pages.py would replace the CSV files
+            # with empty ones, so use the ones already there.
+            print 'Skipping analyze: %s is missing. Run with --fetch to download the pages.' % missing[0]
+            continue
+        inputs = None
+        if stage.inputs is not None:
+            code = [os.path.join(HERE, fn) for fn in stage.code]
+            inputs = state.fingerprint(code + stage.inputs)
+            if not options.force and state.isCurrent(stage.name, inputs, stage.outputs):
+                print '%s is up to date' % stage.name
+                continue
+        print 'Running %s ...' % stage.script
+        state.save()
+        sys.stdout.flush()
+        status = subprocess.call([sys.executable, os.path.join(HERE, stage.script)] + stage.args)
+        if status:
+            sys.exit('%s failed with exit status %d' % (stage.script, status))
+        state = buildstate.BuildState(options.state)       # The stage may have updated it
+        if inputs is not None:
+            state.record(stage.name, inputs, stage.outputs)
+    state.save()
+    print 'Build finished in %.2f s' % (time.time() - start)
@@ -0,0 +1,75 @@
+import csv
+import hashlib
+import os
+from fileutil import replaceFile
+
+
+#---------------------------------------------------------
+#  Content-hash fingerprints of build steps
+#---------------------------------------------------------
+#
+# A CSV file records, for each build step, a fingerprint of its inputs and
+# code and one of its outputs. A step is up to date when both still match.
+# Files are fingerprinted by the sha1 of their contents, which is also
+# recorded along with their size and mtime, so it's only recomputed for
+# files which have been touched since.
+
+class BuildState:
+    def __init__(self, path='build-state.txt'):
+        self.path = path
+        self.files = {}         # path -> (size, mtime, sha1)
+        self.steps = {}         # step -> (inputs fingerprint, outputs fingerprint)
+        self.changed = False
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for row in csv.reader(f):
+                    if row[0] == 'file':
+                        self.files[row[1]] = (int(row[2]), row[3], row[4])
+                    elif row[0] == 'step':
+                        self.steps[row[1]] = (row[2], row[3])
+
+    def fileHash(self, path):
+        # sha1 of the file's contents, or '' if it doesn't exist.
+        try:
+            st = os.stat(path)
+        except OSError:
+            return ''
+        size, mtime = st.st_size, repr(st.st_mtime)
+        entry = self.files.get(path)
+        if entry and entry[:2] == (size, mtime):
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), ''):
+                h.update(block)
+        self.files[path] = (size, mtime, h.hexdigest())
+        self.changed = True
+        return h.hexdigest()
+
+    def fingerprint(self, paths, extra=''):
+        # Combined fingerprint of the named files, and of extra, a string
+        # for anything else the step depends on.
+        h = hashlib.sha1(extra)
+        for path in sorted(paths):
+            h.update('%s\0%s\0' % (path, self.fileHash(path)))
+        return h.hexdigest()
+
+    def isCurrent(self, step, inputs, outputs):
+        # inputs is the step's fingerprint, outputs the files it writes.
+        return self.steps.get(step) == (inputs, self.fingerprint(outputs))
+
+    def record(self, step, inputs, outputs):
+        self.steps[step] = (inputs, self.fingerprint(outputs))
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        with open(self.path + '.tmp', 'wb') as f:
+            w = csv.writer(f)
+            for path, (size, mtime, sha1) in sorted(self.files.iteritems()):
+                w.writerow(['file', path, size, mtime, sha1])
+            for step, (inputs, outputs) in sorted(self.steps.iteritems()):
+                w.writerow(['step', step, inputs, outputs])
+        replaceFile(self.path + '.tmp', self.path)
+        self.changed = False
@@ -1,40 +1,120 @@
-import csv
-import collections
-import math
+import numpy
+import scoring
+import specdata
+from optparse import OptionParser
 from pprint import pprint
 
-def iterCsvRecords(path, className):
-    with open(path, 'rb') as f:
-        reader = csv.reader(f)
-        clazz = None
-        for row in reader:
-            if clazz is None:
-                clazz = collections.namedtuple(className, row)
-            else:
-                yield clazz(*row)
+parser = OptionParser()
+parser.add_option('--all', action='store_true',
+                  help='scan every result in every suite for outlying benchmarks, not just autoparallel ones')
+parser.add_option('--top', type='int', default=50,
+                  help='number of outliers listed by --all [default: %default]')
+parser.add_option('--low', action='store_true',
+                  help='list the benchmarks furthest below their group with --all, instead of above')
+parser.add_option('--min-group', type='int', default=5,
+                  help='smallest group of results to compare a benchmark against [default: %default]')
+options, args = parser.parse_args()
 
-benchTable = collections.defaultdict(dict)
-for brec in iterCsvRecords('benchmarks.txt', 'BenchmarkRecord'):
-    benchTable[brec.testID][brec.benchName] = brec
+dataset = specdata.load(mapped=True)
+tests, benchmarks = dataset.tests, dataset.benchmarks
+machines = dict(zip(tests.testID, tests.machine))
 
-def geomAverage(values):
-    averageExp = sum([math.log(x) for x in values]) / len(values)
-    return math.exp(averageExp)
 
+#---------------------------------------------------------
+#  Test x benchmark matrix
+#---------------------------------------------------------
+
+def columnFlags(column, predicate):
+    # Evaluates predicate once per distinct value of a dictionary column,
+    # and returns a boolean array with one entry per row.
+    flags = numpy.array([bool(predicate(v)) for v in column.values] or [False])
+    return flags[numpy.asarray(column.codes, numpy.intp)]
+
+# benchRows[i, k] is the row in benchmarks of benchmark k in test i, or -1.
+benchNames = benchmarks.benchName.values
+benchRows = scoring.benchmarkMatrix(dataset)
+present = benchRows >= 0
+
+# Multiple of each result's geometric average, for every cell at once.
+baseValues = numpy.asarray(benchmarks.baseValue, numpy.float64)
+values = numpy.where(present, baseValues[benchRows], numpy.nan)
+with numpy.errstate(divide='ignore', invalid='ignore'):
+    ratios = values / scoring.geometricMeans(values, present)[:, numpy.newaxis]
+valid = numpy.isfinite(ratios)
+ratios[~valid] = -numpy.inf
+
+
+#---------------------------------------------------------
+#  Outliers among all results
+#---------------------------------------------------------
+
+def groupedMedians(groups, values):
+    # Returns the distinct groups, sorted, and the median and number of
+    # values in each, using a single sort for all groups.
+    order = numpy.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = numpy.flatnonzero(numpy.concatenate([[True], groups[1:] != groups[:-1]]))
+    counts = numpy.diff(numpy.concatenate([starts, [len(groups)]]))
+    medians = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2
+    return groups[starts], medians, counts
+
+def robustZScores(groups, values, minGroup):
+    # 0.6745 * (x - median) / MAD within each group, which isn't thrown off
+    # by the outliers themselves the way a mean and standard deviation are.
+    # NaN in groups smaller than minGroup or without any spread.
+    keys, medians, counts = groupedMedians(groups, values)
+    index = numpy.searchsorted(keys, groups)
+    deviations = values - medians[index]
+    mads = groupedMedians(groups, numpy.abs(deviations))[1][index]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        z = 0.6745 * deviations / mads
+    z[(counts[index] < minGroup) | ~(mads > 0)] = numpy.nan
+    return z
+
+def scanAll(top, minGroup, low):
+    # Every benchmark of every result is compared with the same benchmark
+    # in other results of the same suite, compiler and hardware year, by
+    # the log of its multiple of its result's geometric average. Autoparallel
+    # benchmarks stand out above their group, so those come first, unless
+    # low is set.
+    testKeys = numpy.column_stack([tests.benchType.codes, tests.compiler.codes, numpy.asarray(tests.hwMonth) // 12])
+    testGroups = numpy.unique(testKeys, axis=0, return_inverse=True)[1].astype(numpy.int64)
+    rows, cols = numpy.nonzero(valid)
+    z = robustZScores(testGroups[rows] * len(benchNames) + cols,
+                      numpy.log(ratios[rows, cols]), minGroup)
+    scored = numpy.flatnonzero(~numpy.isnan(z))
+    ranked = scored[numpy.argsort(z[scored] if low else -z[scored], kind='mergesort')][:top]
+    print 'Benchmarks furthest %s their group among %d results, by robust z-score of the multiple of the' % ('below' if low else 'above', len(tests))
+    print 'geometric average within the same benchmark, suite, compiler and hardware year:'
+    for c in ranked:
+        i, k = rows[c], cols[c]
+        print '%+.2f %f %s %s %s (%s, %s, %s)' % (z[c], ratios[i, k], benchNames[k], tests.testID[i],
+                                                 tests.machine[i], tests.benchType[i], tests.compiler[i], tests.hwAvail[i])
+    print '%d of %d benchmark results were in groups of at least %d.' % (len(scored), len(rows), minGroup)
+
+if options.all:
+    scanAll(options.top, options.min_group, options.low)
+    raise SystemExit
+
+
+#---------------------------------------------------------
+#  Top contributing benchmarks
+#---------------------------------------------------------
+
+autoParallel = columnFlags(tests.autoParallel, lambda v: v == 'Yes')
 for benchType in ['INT', 'FP']:
     print 'Top contributing benchmarks to %s results, by maximum multiple of the geometric average:' % benchType
-    topBenchResults = {}
-    summaryTable = {}
-    for srec in iterCsvRecords('summaries.txt', 'SummaryRecord'):
-        summaryTable[srec.testID] = srec
-        if srec.autoParallel == 'Yes' and benchType in srec.benchType:
-            base = geomAverage([float(brec.base) for brec in benchTable[srec.testID].itervalues()])
-            for brec in benchTable[srec.testID].itervalues():
-                r = (float(brec.base) / base, brec)
-                topBenchResults[brec.benchName] = max(r, topBenchResults.get(brec.benchName, (0, None)))
-    for v, k in sorted([(v, k) for k, v in topBenchResults.iteritems()], reverse=True):
-        benchValue, brec = v
-        print benchValue, k, brec.testID, summaryTable[brec.testID].machine
+    selected = numpy.flatnonzero(autoParallel & columnFlags(tests.benchType, lambda v: benchType in v))
+    topBenchResults = []
+    if len(selected):
+        candidates = ratios[selected]
+        bestRatios = candidates[candidates.argmax(axis=0), numpy.arange(len(benchNames))]
+        for k in numpy.flatnonzero(bestRatios > -numpy.inf):
+            # Like max() over (ratio, BenchmarkRecord) tuples, ties go to
+            # the greater record.
+            ties = selected[candidates[:, k] == bestRatios[k]]
+            brec = max([benchmarks.record(benchRows[i, k]) for i in ties])
+            topBenchResults.append((float(bestRatios[k]), brec, benchNames[k]))
+    for benchValue, brec, k in sorted(topBenchResults, reverse=True):
+        print benchValue, k, brec.testID, machines[brec.testID]
     print
-        
-
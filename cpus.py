@@ -0,0 +1,344 @@
+import bisect
+import collections
+import csv
+import hashlib
+import inspect
+import os
+import re
+import sys
+from fileutil import replaceFile
+
+
+#---------------------------------------------------------
+#  Helper functions
+#---------------------------------------------------------
+
+def isWithinPercent(a, b, percent):
+    if a > b:
+        a, b = b, a     # Make sure a is the smaller one
+    return b < a * (1 + percent / 100.0)
+
+
+#---------------------------------------------------------
+#  Determine CPU family & speed from name
+#---------------------------------------------------------
+
+def extractMHzFromName(name):
+    m = re.search('(\\d+(?:\\.\\d+)?)a? ?([mg]hz)', name.lower())
+    value, units = m.groups()
+    value = float(value)
+    if units == 'ghz':
+        value *= 1000
+    return value
+    
+CPU_CRUFT = ['(TM)', '(R)', 'processor', 'Processor', '\xae', '\x99',
+             'supporting Hyper-Threading Technology',
+             'with Hyper-Threading Technology',
+             'with HT Technology',
+             'dual-core',
+             'Dual-Core',
+             'Quad-Core',
+             'Dual Core',
+             'Single Chip',
+             'w/ MMX technology',
+             'with MMX technology',
+             'with 2MB L2 Cache',
+             '64-bit',
+             'Model']
+PARENTHESES = re.compile('\\([^)]*\\)')
+SPEED = re.compile('/?\\d+(?:\\.\\d+)?[Aa]? ?[mMgG][hH][zZ]')
+
+def normalizeCPUName(name):
+    cpu = name
+    for cruft in CPU_CRUFT:
+        cpu = cpu.replace(cruft, ' ')
+    cpu = PARENTHESES.sub(' ', cpu)
+    cpu = SPEED.sub(' ', cpu)
+    cpu = cpu.split(',')[0]
+    return ' '.join(cpu.split())
+
+# Rules identifying the brand and model from the normalized name, in order
+# of priority: the first pattern which matches at the start of the name
+# wins. In the brand and model templates, \1, \2... stand for the pattern's
+# groups. A function can be given instead, which receives the first group.
+XEON = '(?=.*[Xx][Ee][Oo][Nn])'         # 'xeon' anywhere, in any case
+
+CPU_RULES = [
+    (XEON + '.*?Pentium ?III',                  'Intel Pentium',    'Pentium III Xeon'),
+    ('.*?Pentium ?III',                         'Intel Pentium',    'Pentium III'),
+    (XEON + '.*?Pentium II',                    'Intel Pentium',    'Pentium II Xeon'),
+    ('.*?Pentium II',                           'Intel Pentium',    'Pentium II'),
+    (XEON + '.*?(E7-[^\\s]+)',                  'Intel Xeon',       'Xeon \\1'),
+    (XEON + '.*?(E3-[^\\s]+)',                  'Intel Xeon',       'Xeon \\1'),
+    (XEON + '.*?([A-Z]?\\d{4}[A-Z]?)',          'Intel Xeon',       'Xeon \\1'),
+    ('Intel Xeon MP\\Z',                        'Intel Xeon',       'Xeon MP'),
+    ('(?:Intel )?Xeon\\Z',                      'Intel Xeon',       'Xeon (unspecified model)'),
+    ('Intel Xeon (?:\\d\\.\\d|2M Cache)',       'Intel Xeon',       'Xeon (unspecified model)'),
+    ('Intel Xeon LV',                           'Intel Xeon',       'Xeon LV'),
+    ('Intel LV Xeon 400',                       'Intel Xeon',       'Xeon LV'),
+    ('Intel (Core i.*)',                        'Intel Core',       '\\1'),
+    ('Intel (Core 2 .*)',                       'Intel Core',       '\\1'),
+    ('Intel Core2 (.*)',                        'Intel Core',       'Core 2 \\1'),
+    ('Intel (Core .*)',                         'Intel Core',       '\\1'),
+    ('Intel (Pentium D.*)',                     'Intel Pentium',    '\\1'),
+    ('(R1\\d000.*)',                            'MIPS',             '\\1'),
+    ('MIPS (R1\\d000)',                         'MIPS',             '\\1'),
+    ('.*?(Pentium 4.*)',                        'Intel Pentium',    '\\1'),
+    ('Intel P4\\Z',                             'Intel Pentium',    'Pentium 4'),
+    ('Pentium\\Z',                              'Intel Pentium',    'Pentium'),
+    ('Pentium[ -]Pro\\Z',                       'Intel Pentium',    'Pentium Pro'),
+    ('Intel (Pentium (?:M )?[A-Z]?\\d{3,4}T?)', 'Intel Pentium',    '\\1'),
+    ('Intel (Pentium.*)',                       'Intel Pentium',    '\\1'),
+    ('Celeron\\Z',                              'Intel Celeron',    'Celeron'),
+    ('Intel (Celeron.*)',                       'Intel Celeron',    '\\1'),
+    ('.*?(21\\d64[A-Z]*)',                      'DEC Alpha',        'Alpha \\1'),
+    ('(POWER.*)',                               'IBM POWER',        '\\1'),
+    ('.*?(PowerPC.*)',                          'PowerPC',          '\\1'),
+    ('(RS64 IV|RS64 II)\\Z',                    'PowerPC',          '\\1'),
+    ('(Power.*)',                               'IBM POWER',        lambda name: name.upper()),
+    ('IBM (Power.*)',                           'IBM POWER',        lambda name: name.upper()),
+    ('P2SC',                                    'IBM POWER',        'P2SC'),
+    ('MIPS\\S* (\\S+)',                         'MIPS',             '\\1'),
+    ('((?:100 )?R\\d{4}.*)',                    'MIPS',             '\\1'),
+    ('(SPARC64.*)',                             'Fujitsu SPARC',    '\\1'),
+    ('(MicroSPARC.*)',                          'Sun SPARC',        '\\1'),
+    ('(UltraSPARC.*)',                          'Sun SPARC',        '\\1'),
+    ('(SuperSPARC.*)',                          'Sun SPARC',        '\\1'),
+    ('(SPARC T3)\\Z',                           'Sun SPARC',        '\\1'),
+    ('TurboSPARC\\Z',                           'Fujitsu SPARC',    'TurboSPARC'),
+    ('(?:512k HyperCACHE|HyperSPARC)\\Z',       'Fujitsu SPARC',    'HyperSPARC'),
+    ('ULV Intel Pentium M\\Z',                  'Intel Pentium',    'Pentium M'),
+    ('AMD (FX-.*)',                             'AMD FX',           '\\1'),
+    ('AMD\\S* ((\\S+).*)',                      'AMD \\2',          '\\1'),
+    ('(Opteron.*)',                             'AMD Opteron',      '\\1'),
+    ('.*?(Itanium.*)',                          'Intel Itanium',    lambda name: name.replace('Itanium2', 'Itanium 2').replace(' FSB', '')),
+    ('(PA-.*)',                                 'HP PA-RISC',       lambda name: name.replace('PA-RISC ', 'PA-').replace('_', '')),
+    ('PA8600\\Z',                               'HP PA-RISC',       'PA-8600'),
+]
+
+# Checked against the original name, once none of CPU_RULES matched.
+CPU_NAME_RULES = [
+    ('.*?Xeon',                                 'Intel Xeon',       'Xeon (unspecified model)'),
+]
+
+class CPUClassifier:
+    # The rules are compiled into a few large alternations, each rule's
+    # pattern in its own group, so a single match finds the first rule that
+    # applies. Python's re module tries the alternatives in order, which is
+    # what gives the rules their priority.
+    MAX_GROUPS = 99
+
+    def __init__(self, rules, nameRules=[]):
+        self.rules = list(rules) + list(nameRules)
+        self.hits = [0] * len(self.rules)
+        self.unrecognized = 0
+        self.dispatchers = self.compileRules(0, rules)
+        self.nameDispatchers = self.compileRules(len(rules), nameRules)
+
+    def compileTemplate(self, template):
+        # 'Xeon \\1' -> ['Xeon ', 1, '']
+        if callable(template):
+            return template
+        parts = re.split('\\\\(\\d)', template)
+        for i in xrange(1, len(parts), 2):
+            parts[i] = int(parts[i])
+        return parts
+
+    def compileRules(self, first, rules):
+        # Returns a list of (regex, {group: (rule index, brand, model)}).
+        dispatchers = []
+        alternatives, actions, groups = [], {}, 0
+        for i, (pattern, brand, model) in enumerate(rules):
+            ruleGroups = re.compile(pattern).groups + 1
+            if groups + ruleGroups > self.MAX_GROUPS:
+                dispatchers.append((re.compile('|'.join(alternatives)), actions))
+                alternatives, actions, groups = [], {}, 0
+            actions[groups + 1] = (first + i, self.compileTemplate(brand), self.compileTemplate(model))
+            alternatives.append('(%s)' % pattern)
+            groups += ruleGroups
+        if alternatives:
+            dispatchers.append((re.compile('|'.join(alternatives)), actions))
+        return dispatchers
+
+    def apply(self, dispatchers, text):
+        for regex, actions in dispatchers:
+            m = regex.match(text)
+            if m:
+                # The rule's own group is the last one to close.
+                group = m.lastindex
+                rule, brand, model = actions[group]
+                self.hits[rule] += 1
+                ruleGroups = m.groups()[group:]
+                return self.expand(brand, ruleGroups), self.expand(model, ruleGroups)
+        return None
+
+    def expand(self, template, groups):
+        if callable(template):
+            return template(groups[0])
+        parts = template[:]
+        for i in xrange(1, len(parts), 2):
+            parts[i] = groups[parts[i] - 1] or ''
+        return ''.join(parts)
+
+    def classify(self, name):
+        cpu = normalizeCPUName(name)
+        result = self.apply(self.dispatchers, cpu) or self.apply(self.nameDispatchers, name)
+        if result is None:
+            self.unrecognized += 1
+            return '???', cpu
+        return result
+
+    def classifyMany(self, names):
+        # Classifies each distinct name once.
+        results = {}
+        for name in names:
+            if name not in results:
+                results[name] = self.classify(name)
+        return [results[name] for name in names]
+
+    def stats(self):
+        # (hits, pattern, brand, model) for every rule, most hit first. Rules
+        # which are never hit come last.
+        stats = [(hits, rule[0], rule[1], rule[2]) for hits, rule in zip(self.hits, self.rules)]
+        stats.sort(key=lambda s: -s[0])
+        return stats
+
+CPU_CLASSIFIER = CPUClassifier(CPU_RULES, CPU_NAME_RULES)
+
+def identifyCPUName(name):
+    return CPU_CLASSIFIER.classify(name)
+
+def identifyCPU(r, names=None):
+    # Looks the name up in a CPUNameCache, if given. The only result which
+    # depends on more than the CPU name is special-cased here.
+    brand, model = names.lookup(r.cpu) if names is not None else identifyCPUName(r.cpu)
+    if brand == '???' and r.srec.machine == 'AlphaServer 2100A 5/300':
+        return 'DEC Alpha', 'Alpha 21164'
+    return brand, model
+
+
+#---------------------------------------------------------
+#  Cache of identified CPU names
+#---------------------------------------------------------
+
+def identifyVersion():
+    # Changes whenever this module does, such as when a rule is added.
+    return hashlib.sha1(inspect.getsource(sys.modules[__name__])).hexdigest()
+
+class CPUNameCache:
+    # Memoizes identifyCPUName. There are far fewer distinct CPU names than
+    # results, and each result is identified several times.
+    #
+    # If a path is given, the cache is loaded from that CSV file, and
+    # save() writes it back. The first row holds a hash of this module, so
+    # the file is ignored once the rules change.
+    def __init__(self, path=None):
+        self.path = path
+        self.names = {}
+        self.version = identifyVersion()
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                reader = csv.reader(f)
+                if next(reader, None) == ['version', self.version]:
+                    for name, brand, model in reader:
+                        self.names[name] = (brand, model)
+            self.loaded = len(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        result = self.names.get(name)
+        if result is None:
+            self.misses += 1
+            result = self.names[name] = identifyCPUName(name)
+        else:
+            self.hits += 1
+        return result
+
+    def save(self):
+        if not self.path or len(self.names) == self.loaded:
+            return
+        with open(self.path + '.tmp', 'wb') as f:
+            w = csv.writer(f)
+            w.writerow(['version', self.version])
+            for name, (brand, model) in sorted(self.names.iteritems()):
+                w.writerow([name, brand, model])
+        replaceFile(self.path + '.tmp', self.path)
+        self.loaded = len(self.names)
+
+    def stats(self):
+        return '%d lookups, %d hits, %d misses, %d names' % (self.hits + self.misses, self.hits, self.misses, len(self.names))
+
+
+#---------------------------------------------------------
+#  Uniquely identify CPUs
+#---------------------------------------------------------
+
+CPUInfo = collections.namedtuple('CPUInfo', 'brand model mhz')
+
+class CPUDatabase:
+    # Groups CPUs of the same brand and model whose speeds are within 5% of
+    # each other. Each group is represented by its slowest speed, and the
+    # groups of each model are kept sorted by speed, so a speed is looked
+    # up by bisection.
+    #
+    # identifyMany assigns a whole list of results in one sorted sweep per
+    # model, so the groups don't depend on the order of the results. place
+    # follows the same rule for both: a speed joins the group below it if
+    # that's within 5%, otherwise the group above it if that is, or starts a
+    # new one. So identify agrees with identifyMany on the speeds it swept.
+    def __init__(self, names=None):
+        self.modelSpeeds = collections.defaultdict(list)    # (brand, model) -> CPUInfos, sorted by mhz
+        self.modelAnchors = collections.defaultdict(list)   # (brand, model) -> their mhz
+        self.names = names if names is not None else CPUNameCache()
+
+    def place(self, brand, model, mhz):
+        speeds = self.modelSpeeds[brand, model]
+        anchors = self.modelAnchors[brand, model]
+        i = bisect.bisect_right(anchors, mhz)
+        for j in [i - 1, i]:
+            if 0 <= j < len(anchors) and isWithinPercent(mhz, anchors[j], 5):
+                return speeds[j]
+        cpu = CPUInfo(brand, model, mhz)
+        if mhz == mhz:      # A NaN speed can't be ordered, and never matches
+            speeds.insert(i, cpu)
+            anchors.insert(i, mhz)
+        return cpu
+
+    def identify(self, r):
+        brand, model = identifyCPU(r, self.names)
+        return self.place(brand, model, r.mhz)
+
+    def identifyMany(self, results):
+        # Returns the CPUInfo of each result.
+        byModel = collections.defaultdict(list)
+        for i, r in enumerate(results):
+            byModel[identifyCPU(r, self.names)].append((r.mhz, i))
+        cpus = [None] * len(results)
+        for (brand, model), speeds in byModel.iteritems():
+            # Sweep up from the slowest speed. NaN speeds can't be sorted.
+            speeds = sorted([s for s in speeds if s[0] == s[0]]) + [s for s in speeds if s[0] != s[0]]
+            for mhz, i in speeds:
+                cpus[i] = self.place(brand, model, mhz)
+        return cpus
+
+
+#---------------------------------------------------------
+#  Rule statistics over summaries.txt
+#---------------------------------------------------------
+
+if __name__ == '__main__':
+    import specdata
+    tests = specdata.load().tests
+    for name in tests.cpu:
+        CPU_CLASSIFIER.classify(name)
+    print 'Rule hits over %d results with %d distinct CPU names:' % (len(tests), len(tests.cpu.values))
+    for hits, pattern, brand, model in CPU_CLASSIFIER.stats():
+        if callable(model):
+            model = '(function)'
+        print '%7d  %-44s %s | %s' % (hits, pattern, brand, model)
+    print '%7d  unrecognized' % CPU_CLASSIFIER.unrecognized
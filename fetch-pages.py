@@ -1,67 +1,146 @@
-import urllib2
-import multiprocessing
 import lxml.html
 import os
-import time
+from optparse import OptionParser
+from fetcher import Fetcher, RetryPolicy, FailureJournal, SyncManifest
+from pagestore import PageStore
 
+SITE = 'http://www.spec.org'
+FETCHER = Fetcher()
+RETRY = RetryPolicy()
+JOURNAL = FailureJournal('fetch-failures.txt')
+MANIFEST = SyncManifest(os.path.join('scraped', 'manifest.txt'))
+STORE = PageStore('scraped')
 
-def cachedFetch(url, localPath, verbose=True):
-    if os.path.exists(localPath):
+# Index pages which changed during this run. They are only recorded in the
+# manifest once all of their result pages have been queued and processed,
+# so an interrupted run rescans them next time.
+CHANGED_INDEXES = []
+
+
+def pageName(localPath):
+    # Name of the page inside STORE, e.g. 'cpu95/xyz.asc'.
+    return os.path.relpath(localPath, STORE.root).replace(os.sep, '/')
+
+def cachedFetch(url, localPath, verbose=True, revalidate=False):
+    name = pageName(localPath)
+    entry = MANIFEST.get(url)
+    if entry and name in STORE and not revalidate:
+        return 'Cached ' + url
+    if name not in STORE and os.path.exists(localPath):
+        # Downloaded as a loose file by an older version of this script.
+        with open(localPath, 'rb') as f:
+            data = f.read()
+        STORE.write(name, data)
+        MANIFEST.record(url, localPath, data)
         return 'Cached ' + url
-    try:
-        os.makedirs(os.path.split(localPath)[0])
-    except OSError:
-        pass
     if verbose:
         print 'Fetching %s ...' % url
-    finished=False
-    sleepTime=1
-    while not(finished):
-      try:
-        response = urllib2.urlopen(url)
-        data = response.read()
-        finished=True
-      except:
-        time.sleep(sleepTime)
-        sleepTime*=2
-        print 'Fetching Hit a snag fetching the page, retrying...'
-    with open(localPath, 'wb') as f:
-        f.write(data)
+    headers = MANIFEST.conditionalHeaders(url) if name in STORE else {}
+    status, responseHeaders, data = RETRY.call(FETCHER.request, url, headers)
+    if status == 304:
+        return 'Unchanged ' + url
+    STORE.write(name, data)
+    MANIFEST.record(url, localPath, data, responseHeaders)
     return 'Fetched ' + url
 
-def cachedRead(url, localPath):
-    cachedFetch(url, localPath)
-    return open(localPath, 'rb')
-    
-def mpFetch(args):
-    return cachedFetch(*args, verbose=False)
+def readChangedIndex(url, localPath, full=False):
+    # Revalidates an index page, and returns it parsed, or None if it
+    # hasn't changed since the last completed sync.
+    name = pageName(localPath)
+    headers = {}
+    if not full and name in STORE:
+        headers = MANIFEST.conditionalHeaders(url)
+    print 'Checking %s ...' % url
+    status, responseHeaders, data = RETRY.call(FETCHER.request, url, headers)
+    if status == 304 or (not full and name in STORE and MANIFEST.isUnchanged(url, data)):
+        return None
+    STORE.write(name, data)
+    CHANGED_INDEXES.append((url, localPath, data, responseHeaders))
+    print 'Scanning %s ...' % name
+    return lxml.html.parse(STORE.open(name))
+
+def poolFetch(args):
+    url, localPath, revalidate = args
+    try:
+        return cachedFetch(url, localPath, verbose=False, revalidate=revalidate)
+    except Exception, e:
+        JOURNAL.record(url, localPath, e, RETRY.isRetryable(e))
+        return 'Failed %s (%s)' % (url, e)
 
-def iterateAllPageURLs():
-    with cachedRead('http://www.spec.org/cpu95/results/cpu95.html', os.path.join('scraped', 'cpu95.html')) as f:
-        print 'Scanning cpu95.html ...'
-        doc = lxml.html.parse(f)
-    for elem, attr, link, pos in doc.getroot().iterlinks():
-        if link.lower().endswith('.asc') or link.lower().endswith('.html'):
-            yield 'http://www.spec.org' + link, os.path.join('scraped', 'cpu95', link.split('/')[-1])
+def iterateAllPageURLs(full=False):
+    doc = readChangedIndex(SITE + '/cpu95/results/cpu95.html', os.path.join('scraped', 'cpu95.html'), full)
+    if doc is not None:
+        for elem, attr, link, pos in doc.getroot().iterlinks():
+            if link.lower().endswith('.asc') or link.lower().endswith('.html'):
+                yield SITE + link, os.path.join('scraped', 'cpu95', link.split('/')[-1])
 
-    with cachedRead('http://www.spec.org/cpu2000/results/cpu2000.html', os.path.join('scraped', 'cpu2000.html')) as f:
-        print 'Scanning cpu2000.html ...'
-        doc = lxml.html.parse(f)
-    for elem, attr, link, pos in doc.getroot().iterlinks():
-        if link.lower().endswith('.asc'):
-            yield 'http://www.spec.org/cpu2000/results/' + link, os.path.join('scraped', 'cpu2000', link.split('/')[-1])
+    doc = readChangedIndex(SITE + '/cpu2000/results/cpu2000.html', os.path.join('scraped', 'cpu2000.html'), full)
+    if doc is not None:
+        for elem, attr, link, pos in doc.getroot().iterlinks():
+            if link.lower().endswith('.asc'):
+                yield SITE + '/cpu2000/results/' + link, os.path.join('scraped', 'cpu2000', link.split('/')[-1])
 
-    with cachedRead('http://www.spec.org/cpu2006/results/cpu2006.html', os.path.join('scraped', 'cpu2006.html')) as f:
-        print 'Scanning cpu2006.html ...'
-        doc = lxml.html.parse(f)
-    for elem, attr, link, pos in doc.getroot().iterlinks():
-        if link.lower().endswith('.txt'):
-            yield 'http://www.spec.org/cpu2006/results/' + link, os.path.join('scraped', 'cpu2006', link.split('/')[-1])
+    doc = readChangedIndex(SITE + '/cpu2006/results/cpu2006.html', os.path.join('scraped', 'cpu2006.html'), full)
+    if doc is not None:
+        for elem, attr, link, pos in doc.getroot().iterlinks():
+            if link.lower().endswith('.txt'):
+                yield SITE + '/cpu2006/results/' + link, os.path.join('scraped', 'cpu2006', link.split('/')[-1])
 
 if __name__ == '__main__':
-    allPageURLs = list(iterateAllPageURLs())
-    pool = multiprocessing.Pool(20)
+    parser = OptionParser()
+    parser.add_option('-j', '--jobs', type='int', default=20,
+                      help='maximum number of concurrent requests / open connections [default: %default]')
+    parser.add_option('-r', '--rate', type='float', default=0,
+                      help='maximum requests per second to each host, 0 for unlimited [default: %default]')
+    parser.add_option('--timeout', type='float', default=60,
+                      help='socket timeout in seconds [default: %default]')
+    parser.add_option('--site', default=SITE,
+                      help='base URL to fetch from, e.g. a local mirror [default: %default]')
+    parser.add_option('--max-attempts', type='int', default=6,
+                      help='attempts per page before giving up on it [default: %default]')
+    parser.add_option('--max-delay', type='float', default=60,
+                      help='upper bound on the backoff between attempts, in seconds [default: %default]')
+    parser.add_option('--journal', default=JOURNAL.path,
+                      help='file listing the pages that could not be fetched [default: %default]')
+    parser.add_option('--retry-failed', action='store_true',
+                      help='only retry the pages listed in the journal, including permanent failures such as 404s, without checking the index pages')
+    parser.add_option('--full', action='store_true',
+                      help='rescan every index page, even if it has not changed since the last sync')
+    parser.add_option('--verify', action='store_true',
+                      help='also revalidate every previously synced result page with a conditional GET')
+    options, args = parser.parse_args()
+    SITE = options.site.rstrip('/')
+    FETCHER = Fetcher(options.jobs, options.rate, options.timeout)
+    RETRY = RetryPolicy(options.max_attempts, maxDelay=options.max_delay)
+    JOURNAL = FailureJournal(options.journal)
+
+    # Previously failed pages, plus the delta of pages which are not in
+    # the manifest yet. Permanent failures are only retried when asked to,
+    # and otherwise stay in the journal as they are.
+    journaled = JOURNAL.load()
+    retried = [e for e in journaled if e.kind == 'retryable' or options.retry_failed]
+    kept = [e for e in journaled if e not in retried]
+    allPageURLs = [(e.url, e.localPath, False) for e in retried]
+    if not options.retry_failed:
+        queued = set([e.url for e in journaled])
+        allPageURLs += [(url, localPath, False) for url, localPath in iterateAllPageURLs(options.full)
+                        if (url not in MANIFEST or pageName(localPath) not in STORE) and url not in queued]
+        if options.verify:
+            allPageURLs += [(e.url, e.localPath, True) for e in MANIFEST.entries.values()
+                            if os.path.dirname(e.localPath) != 'scraped']
     i = 0
-    for result in pool.imap_unordered(mpFetch, allPageURLs):
+    for result in FETCHER.imapUnordered(poolFetch, allPageURLs):
         i += 1
         print '%d/%d ... %s' % (i, len(allPageURLs), result)
+    JOURNAL.save(kept)
+    for url, localPath, data, headers in CHANGED_INDEXES:
+        MANIFEST.record(url, localPath, data, headers)
+    MANIFEST.save()
+    STORE.close()
+    failed = JOURNAL.load()
+    if failed:
+        permanent = len([e for e in failed if e.kind == 'permanent'])
+        print '%d pages failed; see %s.' % (len(failed), JOURNAL.path),
+        print '%d will be retried on the next run, and %d permanent failures only with --retry-failed.' % (len(failed) - permanent, permanent)
+    else:
+        print 'Synced %d new or changed pages.' % len(allPageURLs)
@@ -0,0 +1,325 @@
+import collections
+import csv
+import hashlib
+import httplib
+import os
+import random
+import socket
+import threading
+import time
+import urlparse
+import Queue
+from fileutil import replaceFile
+
+
+#---------------------------------------------------------
+#  Errors
+#---------------------------------------------------------
+
+class FetchError(Exception):
+    def __init__(self, url, status, reason):
+        Exception.__init__(self, '%s: HTTP %s %s' % (url, status, reason))
+        self.url = url
+        self.status = status
+        self.reason = reason
+
+
+#---------------------------------------------------------
+#  Retry policy
+#---------------------------------------------------------
+
+class RetryPolicy:
+    # Retries transient errors (network trouble, timeouts, 5xx, 408, 429)
+    # with capped, fully-jittered exponential backoff, up to maxAttempts
+    # per call. Anything else, such as a 404, fails immediately.
+    RETRYABLE_STATUS = set([408, 429, 500, 502, 503, 504])
+
+    def __init__(self, maxAttempts=6, baseDelay=1.0, maxDelay=60.0):
+        self.maxAttempts = maxAttempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+    def isRetryable(self, e):
+        if isinstance(e, FetchError):
+            return e.status in self.RETRYABLE_STATUS
+        return isinstance(e, (socket.error, httplib.HTTPException, EnvironmentError))
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+    def call(self, func, *args):
+        for attempt in xrange(self.maxAttempts):
+            try:
+                return func(*args)
+            except Exception, e:
+                if not self.isRetryable(e) or attempt + 1 >= self.maxAttempts:
+                    raise
+                print 'Hit a snag fetching the page (%s), retrying...' % e
+                time.sleep(self.delay(attempt))
+
+
+#---------------------------------------------------------
+#  Failure journal
+#---------------------------------------------------------
+
+JournalEntry = collections.namedtuple('JournalEntry', 'url localPath kind error')
+
+class FailureJournal:
+    # Tab-separated lines of url, localPath, kind, error. kind is
+    # 'retryable' for errors which may go away by themselves (see
+    # RetryPolicy), and 'permanent' for the rest, such as a 404. Entries are
+    # appended as failures happen, so the journal survives an interrupted
+    # run; the last line for a URL wins. Entries are only dropped by save(),
+    # once a run has been through all of them, so a page stays journaled
+    # until it has actually been fetched.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.failed = collections.OrderedDict()     # url -> JournalEntry, this run
+
+    def load(self):
+        entries = collections.OrderedDict()
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        fields = line.rstrip('\n').split('\t')
+                        if len(fields) < 4 or fields[2] not in ['retryable', 'permanent']:
+                            fields[2:2] = ['retryable']      # Written before kinds were recorded
+                        entries[fields[0]] = JournalEntry(fields[0], fields[1], fields[2], '\t'.join(fields[3:]))
+        return entries.values()
+
+    def record(self, url, localPath, error, retryable=True):
+        entry = JournalEntry(url, localPath, 'retryable' if retryable else 'permanent', ' '.join(str(error).split()))
+        with self.lock:
+            self.failed[url] = entry
+            with open(self.path, 'ab') as f:
+                f.write('%s\t%s\t%s\t%s\n' % entry)
+
+    def save(self, kept=[]):
+        # Rewrites the journal with the pages which failed during this run,
+        # plus kept, journaled entries which this run didn't retry.
+        with self.lock:
+            with open(self.path + '.tmp', 'wb') as f:
+                for entry in kept:
+                    if entry.url not in self.failed:
+                        f.write('%s\t%s\t%s\t%s\n' % entry)
+                for entry in self.failed.itervalues():
+                    f.write('%s\t%s\t%s\t%s\n' % entry)
+            replaceFile(self.path + '.tmp', self.path)
+
+
+#---------------------------------------------------------
+#  Sync manifest
+#---------------------------------------------------------
+
+ManifestEntry = collections.namedtuple('ManifestEntry', 'url localPath size sha1 etag lastModified')
+
+class SyncManifest:
+    # CSV record of every page synced so far. Updates are appended as they
+    # happen, so an interrupted run loses nothing; the last row for a URL
+    # wins, and save() compacts the file.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for row in csv.reader(f):
+                    if row and row != list(ManifestEntry._fields):
+                        entry = ManifestEntry(*row)
+                        self.entries[entry.url] = entry._replace(size=int(entry.size))
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def isUnchanged(self, url, data):
+        entry = self.entries.get(url)
+        return entry is not None and entry.size == len(data) and entry.sha1 == hashlib.sha1(data).hexdigest()
+
+    def conditionalHeaders(self, url):
+        headers = {}
+        entry = self.entries.get(url)
+        if entry:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.lastModified:
+                headers['If-Modified-Since'] = entry.lastModified
+        return headers
+
+    def record(self, url, localPath, data, headers={}):
+        entry = ManifestEntry(url, localPath, len(data), hashlib.sha1(data).hexdigest(),
+                              headers.get('etag', ''), headers.get('last-modified', ''))
+        with self.lock:
+            self.entries[url] = entry
+            writeHeader = not os.path.exists(self.path)
+            with open(self.path, 'ab') as f:
+                w = csv.writer(f)
+                if writeHeader:
+                    w.writerow(ManifestEntry._fields)
+                w.writerow(entry)
+        return entry
+
+    def save(self):
+        with self.lock:
+            with open(self.path + '.tmp', 'wb') as f:
+                w = csv.writer(f)
+                w.writerow(ManifestEntry._fields)
+                for url, entry in sorted(self.entries.iteritems()):
+                    w.writerow(entry)
+            replaceFile(self.path + '.tmp', self.path)
+
+
+#---------------------------------------------------------
+#  Per-host rate limiting
+#---------------------------------------------------------
+
+class RateLimiter:
+    # Spaces out requests to each host so that no more than `rate` of them
+    # start per second. A rate of 0 means unlimited.
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.nextSlot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.nextSlot.get(host, now))
+            self.nextSlot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+#---------------------------------------------------------
+#  Pool of persistent HTTP/1.1 connections
+#---------------------------------------------------------
+
+class ConnectionPool:
+    def __init__(self, maxConnections, timeout):
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.idle = {}          # (scheme, host) -> list of idle connections
+        self.open = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, scheme, host):
+        key = scheme, host
+        with self.cond:
+            while True:
+                idle = self.idle.get(key)
+                if idle:
+                    return idle.pop()
+                if self.open < self.maxConnections:
+                    self.open += 1
+                    break
+                # Every connection is busy or parked on another host.
+                # Close an idle one if possible, otherwise wait.
+                for other in self.idle.itervalues():
+                    if other:
+                        other.pop().close()
+                        self.open -= 1
+                        break
+                else:
+                    self.cond.wait()
+        clazz = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        return clazz(host, timeout=self.timeout)
+
+    def release(self, scheme, host, conn, reusable=True):
+        with self.cond:
+            if reusable:
+                self.idle.setdefault((scheme, host), []).append(conn)
+            else:
+                conn.close()
+                self.open -= 1
+            self.cond.notify()
+
+    def closeAll(self):
+        with self.cond:
+            for idle in self.idle.itervalues():
+                for conn in idle:
+                    conn.close()
+                    self.open -= 1
+            self.idle = {}
+            self.cond.notify_all()
+
+
+#---------------------------------------------------------
+#  Fetcher
+#---------------------------------------------------------
+
+class Fetcher:
+    def __init__(self, concurrency=20, rate=0, timeout=60):
+        self.concurrency = concurrency
+        self.pool = ConnectionPool(concurrency, timeout)
+        self.limiter = RateLimiter(rate)
+
+    def request(self, url, headers={}, maxRedirects=5):
+        # Returns (status, responseHeaders, body). Redirects are followed;
+        # 200 and 304 are returned, other statuses raise FetchError.
+        for i in xrange(maxRedirects + 1):
+            scheme, host, path, query, fragment = urlparse.urlsplit(url)
+            if query:
+                path += '?' + query
+            self.limiter.wait(host)
+            conn = self.pool.acquire(scheme, host)
+            try:
+                conn.request('GET', path or '/', headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except:
+                self.pool.release(scheme, host, conn, reusable=False)
+                raise
+            self.pool.release(scheme, host, conn, reusable=not response.will_close)
+            if response.status in (301, 302, 303, 307) and response.getheader('location'):
+                url = urlparse.urljoin(url, response.getheader('location'))
+                continue
+            if response.status not in (200, 304):
+                raise FetchError(url, response.status, response.reason)
+            return response.status, dict(response.getheaders()), body
+        raise FetchError(url, response.status, 'Too many redirects')
+
+    def get(self, url):
+        return self.request(url)[2]
+
+    def imapUnordered(self, func, items):
+        # Runs func over items in `concurrency` worker threads, which share
+        # the connection pool, and yields results as they complete.
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        items = list(items)
+        for item in items:
+            tasks.put(item)
+
+        def worker():
+            while True:
+                try:
+                    item = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results.put((True, func(item)))
+                except BaseException, e:
+                    results.put((False, e))
+
+        threads = [threading.Thread(target=worker) for i in xrange(min(self.concurrency, len(items)))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            for i in xrange(len(items)):
+                ok, value = results.get(True, 1e9)      # timeout keeps Ctrl-C working
+                if not ok:
+                    raise value
+                yield value
+        finally:
+            while True:
+                try:
+                    tasks.get_nowait()
+                except Queue.Empty:
+                    break
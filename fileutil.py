@@ -0,0 +1,13 @@
+import os
+
+
+#---------------------------------------------------------
+#  Atomic file replacement
+#---------------------------------------------------------
+
+def replaceFile(tmpPath, path):
+    # Renames a finished tmpPath over path, so that readers only ever see
+    # the old file or the new one.
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)     # Windows can't rename over an existing file
+    os.rename(tmpPath, path)
@@ -0,0 +1,269 @@
+import array
+import collections
+import hashlib
+import itertools
+import os
+import sys
+from contextlib import contextmanager
+import numpy
+import specdata
+import scoring
+from cpus import CPUDatabase, CPUNameCache
+
+
+#---------------------------------------------------------
+#  Helper functions
+#---------------------------------------------------------
+
+def monthDelta(loMonth, hiMonth):
+    # Takes month indexes (year * 12 + month - 1, see specdata.monthIndex).
+    # Gives the same result as the datetime-based version this replaced,
+    # which subtracted loDate.month where it should have added it.
+    return hiMonth - loMonth + 2 * (loMonth % 12 + 1)
+
+MONTH_LABELS = {}
+
+def monthLabel(month):
+    # 'Mar-2011' style label, formatted once per distinct month.
+    label = MONTH_LABELS.get(month)
+    if label is None:
+        label = MONTH_LABELS[month] = specdata.monthDate(month).strftime('%Y-%b')
+    return label
+
+@contextmanager
+def redirected_to_file(path):
+    save_stdout = sys.stdout
+    sys.stdout = open(path, 'w')
+    try:
+        yield None
+    finally:
+        sys.stdout = save_stdout
+        
+
+
+#---------------------------------------------------------
+#  Iterate through CPU95, CPU2000, CPU2006 results
+#---------------------------------------------------------
+
+DISQUALIFIED_BENCHMARKS = [
+    '483.xalancbmk',
+    '445.gobmk',
+    '456.hmmer',
+    '464.h264ref',
+    '429.mcf',
+    '462.libquantum'
+    '434.zeusmp',
+    '459.GemsFDTD',
+    '437.leslie3d',
+    '436.cactusADM',
+    '470.lbm',
+    '410.bwaves',
+]
+
+class ResultStore:
+    # All results, kept as columns: the test fields stay in the dataset's
+    # dictionary-encoded columns, whose strings are shared by every row,
+    # and each result's score and the benchmarks it was scored on are kept
+    # in typed arrays. Result objects are only created when a row is
+    # accessed, and hold nothing but the row index.
+    def __init__(self, dataset, scores, benchRows, benchStart):
+        self.dataset = dataset
+        self.tests = dataset.tests
+        self.scores = scores                # numpy array, one per result
+        self.benchRows = benchRows          # rows in dataset.benchmarks...
+        self.benchStart = benchStart        # ...of result i start at benchStart[i]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, i):
+        return Result(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self.scores)):
+            yield Result(self, i)
+
+class Result(object):
+    __slots__ = ['store', 'index']
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    benchType = property(lambda self: self.store.tests.benchType[self.index])
+    cpu = property(lambda self: self.store.tests.cpu[self.index])
+    mhz = property(lambda self: self.store.tests.mhzValue[self.index])
+    month = property(lambda self: self.store.tests.hwMonth[self.index])
+    score = property(lambda self: float(self.store.scores[self.index]))
+    srec = property(lambda self: self.store.tests.record(self.index))
+
+    @property
+    def benches(self):
+        store = self.store
+        rows = store.benchRows[store.benchStart[self.index]:store.benchStart[self.index + 1]]
+        return [store.dataset.benchmarks.record(j) for j in rows]
+
+    def sortKey(self):
+        # Same order as the namedtuple results used to have.
+        return (self.benchType, self.cpu, self.mhz, self.month, self.score, self.srec, self.benches)
+
+    def __cmp__(self, other):
+        return cmp(self.sortKey(), other.sortKey())
+
+def loadResults(directory='.'):
+    return scoreResults(specdata.load(directory))
+
+def scoreResults(dataset, excluded=DISQUALIFIED_BENCHMARKS):
+    # Scores every result of dataset without the excluded benchmarks.
+    tests, benchmarks = dataset.tests, dataset.benchmarks
+    scores = scoring.resultScores(dataset, excluded)
+    benchRows = array.array('i')
+    benchStart = array.array('i')
+    for i in xrange(len(tests)):
+        if tests.hwMonth[i] < 0:
+            raise ValueError('Unrecognized hardware availability date: %s' % tests.hwAvail[i])
+        # Benchmarks are keyed by name, so a repeated benchmark counts once.
+        benchTable = {}
+        for j in dataset.benchRange(i):
+            benchTable[benchmarks.benchName[j]] = j
+        benchStart.append(len(benchRows))
+        benchRows.extend([j for j in benchTable.itervalues()
+                          if benchmarks.benchName[j] not in excluded])
+    benchStart.append(len(benchRows))
+    return ResultStore(dataset, scores, benchRows, benchStart)
+
+
+#---------------------------------------------------------
+#  Uniquely identify CPUs
+#---------------------------------------------------------
+
+def openCPUDatabase(directory='.'):
+    # Identified CPU names are cached in cpunames.txt between runs.
+    return CPUDatabase(CPUNameCache(os.path.join(directory, 'cpunames.txt')))
+
+def identifyResults(results, cpudb):
+    # Returns the CPUInfo of each result, and a numpy array numbering the
+    # distinct CPUs.
+    cpus = cpudb.identifyMany(results)
+    cpuNumbers = {}
+    return cpus, numpy.array([cpuNumbers.setdefault(cpu, len(cpuNumbers)) for cpu in cpus], int)
+
+def printIdentifiedCPUs(results, cpus, cpudb):
+    # Dump table of identified CPU names. cpus is as returned by
+    # identifyResults, so the speed groups match the reports.
+    # Good for tweaking identifyCPU.
+    # Number of CPUs in each brand:
+    brand = None
+    for k, speeds in sorted(cpudb.modelSpeeds.items()) + [((None, ''), [])]:
+        if brand != k[0]:
+            if brand is not None:
+                print '%s x %d' % (brand, count)
+            brand = k[0]
+            count = 0
+        count += 1
+    print
+
+    # Individual models:
+    table = dict([(r.cpu, (r, cpu)) for r, cpu in zip(results, cpus)])
+    for dummy, (r, cpu) in sorted(table.items()):
+        id = '%s|%s (%d Mhz)' % (cpu.brand, cpu.model, r.mhz)
+        print '%-60s "%s" %s#%s' % (id, r.cpu, r.benchType, r.srec.testID)
+        print '%-60s "%s" %s#%s' % (id, r.cpu, r.benchType, r.srec.testID)
+
+def writeIdentifiedCPUs(path, results, cpus, cpudb):
+    with redirected_to_file(path):
+        printIdentifiedCPUs(results, cpus, cpudb)
+
+
+#---------------------------------------------------------
+#  Converted scores and reports for INT or FP
+#---------------------------------------------------------
+
+# month is a month index, which sorts and subtracts faster than a datetime.
+ResultInBrand = collections.namedtuple('ResultInBrand', 'month convertedScore cpu result')
+
+ModeAnalysis = collections.namedtuple('ModeAnalysis', 'benchTypes ratio2000 ratio2006 resultsByBrand')
+
+def sortResultsInBrand(rib):
+    # Same order as rib.sort(), but the results themselves, which are slow
+    # to compare, are only compared where month, score and CPU are tied.
+    rib.sort(key=lambda r: r[:3])
+    i = 0
+    for k, group in itertools.groupby(rib, lambda r: r[:3]):
+        group = list(group)
+        if len(group) > 1:
+            group.sort(key=lambda r: r.result.sortKey())
+            rib[i:i + len(group)] = group
+        i += len(group)
+
+def analyzeMode(mode, results, cpus, cpuNumbers):
+    # mode is 'INT' or 'FP'. cpus and cpuNumbers are as returned by
+    # identifyResults.
+    benchTypes = [t % mode for t in ['C%s95', 'C%s2000', 'C%s2006']]
+    
+    # Index of each result's type in benchTypes, or -1 if it's not in this mode.
+    typeIndex = [benchTypes.index(t) if t in benchTypes else -1 for t in results.tests.benchType.values]
+    suites = numpy.array(typeIndex, int)[numpy.asarray(results.tests.benchType.codes, numpy.intp)]
+
+    # Find conversion ratios by taking the geometric average of all
+    # available conversion ratios, from every CPU which has results in
+    # both suites, and convert all scores at once.
+    (ratio2000, ratio2006), conversionRatios = scoring.conversionRatios(results.scores, cpuNumbers, suites)
+    convertedScores = scoring.convertScores(results.scores, suites, conversionRatios)
+
+    # Group results by brand and sort.
+    resultsByBrand = collections.defaultdict(list)
+    for i in numpy.flatnonzero(suites >= 0):
+        r = results[i]
+        cpu = cpus[i]
+        resultsByBrand[cpu.brand].append(ResultInBrand(r.month, float(convertedScores[i]), cpu, r))
+    for rib in resultsByBrand.itervalues():
+        sortResultsInBrand(rib)
+    return ModeAnalysis(benchTypes, ratio2000, ratio2006, resultsByBrand)
+
+def filterAnalysis(analysis, loMonth=None, hiMonth=None, brands=None):
+    # Keeps only the results from loMonth to hiMonth, inclusive, of the
+    # given brands. The conversion ratios stay those of all results.
+    resultsByBrand = collections.defaultdict(list)
+    for brand, rib in analysis.resultsByBrand.iteritems():
+        if brands is None or brand in brands:
+            rib = [r for r in rib if (loMonth is None or r.month >= loMonth) and (hiMonth is None or r.month <= hiMonth)]
+            if rib:
+                resultsByBrand[brand] = rib
+    return analysis._replace(resultsByBrand=resultsByBrand)
+
+def printReport(analysis):
+    benchTypes, ratio2000, ratio2006, resultsByBrand = analysis
+    print '%s = %f x %s' % (benchTypes[1], ratio2000, benchTypes[0])
+    print '%s = %f x %s' % (benchTypes[2], ratio2006, benchTypes[1])
+    print
+    for brand, rib in sorted(resultsByBrand.items()):
+        print
+        print
+        print brand
+        print '=' * len(brand)
+        for month, convertedScore, cpu, result in rib:
+            print '    %s: %f by "%s" %d MHz (%s=%.1f, %s) %s' % (
+                monthLabel(month),
+                convertedScore,
+                cpu.model,
+                cpu.mhz,
+                result.benchType,
+                result.score,
+                result.srec.testID,
+                ', '.join([brec.base for brec in result.benches]))
+
+def writeReport(path, analysis):
+    with redirected_to_file(path):
+        printReport(analysis)
+
+def analysisFingerprint(analysis):
+    # sha1 of everything the report and graph of a mode are made from, so
+    # they only need to be redone when it changes.
+    h = hashlib.sha1(repr(tuple(analysis[:3])))
+    for brand, rib in sorted(analysis.resultsByBrand.items()):
+        h.update(repr(brand))
+        for month, convertedScore, cpu, result in rib:
+            h.update(repr((month, convertedScore, cpu, result.score, result.srec,
+                           [brec.base for brec in result.benches])))
+    return h.hexdigest()
@@ -0,0 +1,123 @@
+import bz2
+import mmap
+import os
+import sys
+import threading
+from cStringIO import StringIO
+
+
+#---------------------------------------------------------
+#  Single-file compressed page store
+#---------------------------------------------------------
+#
+# Pages are stored bz2-compressed, one after another, in an append-only
+# pack file (pages.pack). A text index (pages.idx) maps each page name, such
+# as 'cpu2006/cpu2006-20110620-17230.txt', to the offset and length of its
+# compressed data, followed by its uncompressed size.
+#
+# Data is always written to the pack before its index line, so a crash can
+# at worst leave some unreferenced bytes at the end of the pack. If a page
+# is written twice, the last index line wins.
+#
+# Reads go through a read-only memory map of the pack, so the compressed
+# data is handed to bz2 without being copied or read() first.
+
+class PageStore:
+    def __init__(self, root='scraped'):
+        self.root = root
+        self.packPath = os.path.join(root, 'pages.pack')
+        self.indexPath = os.path.join(root, 'pages.idx')
+        self.index = {}         # name -> (offset, length, size)
+        self.lock = threading.Lock()
+        self.packMap = None
+        self.writeFile = None
+        if os.path.exists(self.indexPath):
+            packSize = os.path.getsize(self.packPath) if os.path.exists(self.packPath) else 0
+            with open(self.indexPath, 'rb') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) != 4:
+                        continue        # Torn write
+                    name, offset, length, size = fields
+                    offset, length, size = int(offset), int(length), int(size)
+                    if offset + length <= packSize:
+                        self.index[name] = (offset, length, size)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def stat(self, name):
+        # (offset, length, size) of the page, or None. Changes whenever the
+        # page is rewritten.
+        return self.index.get(name)
+
+    def listdir(self, dirname):
+        prefix = dirname.rstrip('/') + '/'
+        return sorted([name[len(prefix):] for name in self.index
+                       if name.startswith(prefix) and '/' not in name[len(prefix):]])
+
+    def mapPack(self, minSize):
+        # Returns a memory map of the pack which is at least minSize bytes
+        # long, remapping it if pages were appended since it was mapped.
+        with self.lock:
+            if self.packMap is None or len(self.packMap) < minSize:
+                # Buffers into the old map keep it alive until they're done.
+                with open(self.packPath, 'rb') as f:
+                    self.packMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.packMap
+
+    def read(self, name):
+        offset, length, size = self.index[name]
+        return bz2.decompress(buffer(self.mapPack(offset + length), offset, length))
+
+    def open(self, name):
+        return StringIO(self.read(name))
+
+    def write(self, name, data):
+        compressed = bz2.compress(data, 9)
+        with self.lock:
+            if self.writeFile is None:
+                if not os.path.isdir(self.root):
+                    os.makedirs(self.root)
+                self.writeFile = open(self.packPath, 'ab')
+                self.writeFile.seek(0, os.SEEK_END)
+            offset = self.writeFile.tell()
+            self.writeFile.write(compressed)
+            self.writeFile.flush()
+            with open(self.indexPath, 'ab') as f:
+                f.write('%s\t%d\t%d\t%d\n' % (name, offset, len(compressed), len(data)))
+            self.index[name] = (offset, len(compressed), len(data))
+
+    def close(self):
+        with self.lock:
+            for f in [self.packMap, self.writeFile]:
+                if f is not None:
+                    f.close()
+            self.packMap = self.writeFile = None
+
+
+#---------------------------------------------------------
+#  Convert a folder of loose pages into a page store
+#---------------------------------------------------------
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else 'scraped'
+    store = PageStore(root)
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for fn in sorted(filenames):
+            path = os.path.join(dirpath, fn)
+            if dirpath == root and not fn.lower().endswith('.html'):
+                continue        # The store itself, manifest, caches...
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name not in store:
+                with open(path, 'rb') as f:
+                    store.write(name, f.read())
+                count += 1
+                if count % 1000 == 0:
+                    print 'Packed %d pages ...' % count
+    store.close()
+    print 'Packed %d pages into %s. The loose files can now be deleted.' % (count, store.packPath)
@@ -0,0 +1,85 @@
+import sys
+import time
+from optparse import OptionParser
+import resultsdb
+
+#---------------------------------------------------------
+#  Query the results database built by analyze-pages.py
+#---------------------------------------------------------
+#
+# Examples:
+#   query-results.py --type CINT2006 --model "Xeon E5%" --year 2011
+#   query-results.py --brand "AMD Opteron" --benchmarks
+#   query-results.py "SELECT brand, COUNT(*) FROM tests GROUP BY brand"
+
+COLUMNS = ['testID', 'benchType', 'hwAvail', 'brand', 'model', 'mhz', 'base', 'peak', 'machine']
+
+def buildQuery(options):
+    where = []
+    params = []
+    for column, value in [('benchType', options.type), ('brand', options.brand), ('testID', options.test)]:
+        if value:
+            where.append('%s = ?' % column)
+            params.append(value)
+    for column, pattern in [('model', options.model), ('cpu', options.cpu), ('machine', options.machine)]:
+        if pattern:
+            where.append('%s LIKE ?' % column)
+            params.append(pattern)
+    if options.year:
+        # Range on hwDate, so the index can be used.
+        where.append('hwDate BETWEEN ? AND ?')
+        params += ['%04d-01' % options.year, '%04d-12' % options.year]
+    sql = 'SELECT id, %s FROM tests' % ', '.join(COLUMNS)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY hwDate, benchType, testID'
+    if options.limit:
+        sql += ' LIMIT %d' % options.limit
+    return sql, params
+
+def formatValue(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '%g' % value
+    return str(value)
+
+def printRows(header, rows):
+    print '\t'.join(header)
+    for row in rows:
+        print '\t'.join([formatValue(v) for v in row])
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] [SQL]')
+    parser.add_option('--db', default='results.db',
+                      help='database written by analyze-pages.py --sqlite [default: %default]')
+    parser.add_option('-t', '--type', help='benchmark type, e.g. CINT2006')
+    parser.add_option('-b', '--brand', help='identified brand, e.g. "Intel Xeon"')
+    parser.add_option('-m', '--model', help='identified model, SQL LIKE pattern, e.g. "Xeon E5%"')
+    parser.add_option('--cpu', help='CPU name as listed by SPEC, SQL LIKE pattern')
+    parser.add_option('--machine', help='machine name, SQL LIKE pattern')
+    parser.add_option('--test', help='testID of a single result')
+    parser.add_option('-y', '--year', type='int', help='year the hardware became available')
+    parser.add_option('--limit', type='int', help='maximum number of results')
+    parser.add_option('--benchmarks', action='store_true',
+                      help='also list the individual benchmark results of each test')
+    options, args = parser.parse_args()
+
+    conn = resultsdb.connect(options.db)
+    start = time.time()
+    if args:
+        # Raw SQL.
+        cursor = conn.execute(' '.join(args))
+        rows = cursor.fetchall()
+        printRows([d[0] for d in cursor.description or []], rows)
+    else:
+        sql, params = buildQuery(options)
+        rows = conn.execute(sql, params).fetchall()
+        if options.benchmarks:
+            print '\t'.join(COLUMNS + ['benchName', 'benchBase', 'benchPeak'])
+            for row in rows:
+                for bench in conn.execute('SELECT benchName, base, peak FROM benchmarks WHERE test = ? ORDER BY benchName', (row[0],)):
+                    print '\t'.join([formatValue(v) for v in row[1:] + bench])
+        else:
+            printRows(COLUMNS, [row[1:] for row in rows])
+    sys.stderr.write('%d rows in %.1f ms\n' % (len(rows), (time.time() - start) * 1000))
@@ -0,0 +1,288 @@
+import itertools
+import math
+import sys
+from contextlib import contextmanager
+import cairo
+import specdata
+from graphdata import monthDelta
+
+try:
+    import PIL.Image
+except ImportError:
+    sys.stderr.write('PIL not installed. HQ antialiasing is disabled.\n')
+
+
+#---------------------------------------------------------
+#  Graph rendering
+#---------------------------------------------------------
+#
+# Imported only when graphs are rendered, so that identifying CPUs and
+# writing reports doesn't need pycairo.
+
+@contextmanager
+def saved(cr):
+    cr.save()
+    try:
+        yield cr
+    finally:
+        cr.restore()
+
+if 'PIL' in globals():
+    class HQSurface:
+        # Supersampled by 2**zooms in each direction, then downsampled with
+        # PIL. Drawing goes to a recording surface, which is replayed into
+        # one reusable surface a horizontal band at a time, so only a band's
+        # worth of supersampled pixels is ever allocated. Drawing is recorded
+        # at the supersampled size, so text is hinted as it would be in one
+        # big image, and each band only shifts and clips the replay. Bands
+        # are drawn BAND_MARGIN rows taller on each side and cropped after
+        # downsampling, so the filter sees the same pixels as it would in one
+        # big image. pycairo versions without RecordingSurface draw the whole
+        # image in one band.
+        BAND_HEIGHT = 32
+        BAND_MARGIN = 2
+
+        def __init__(self, width, height, zooms=2):
+            self.width, self.height = width, height
+            self.zooms = zooms
+            if hasattr(cairo, 'RecordingSurface'):
+                self.recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+                self.cr = cairo.Context(self.recording)
+                self.bandHeight = min(self.BAND_HEIGHT + 2 * self.BAND_MARGIN, height)
+            else:
+                self.recording = None
+                self.bandHeight = height
+            self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width * 2**zooms, self.bandHeight * 2**zooms)
+            if self.recording is None:
+                self.cr = cairo.Context(self.surface)
+            cr = self.cr
+            if zooms > 0:
+                cr.scale(2.0, 2.0)
+                cr.translate(0.5, 0.5)
+            for i in xrange(1, zooms):
+                cr.scale(2.0, 2.0)
+
+        def bands(self):
+            # Yields (top, bottom, lo, hi): the rows of the final image each
+            # band contributes, and the rows it's drawn from.
+            if self.recording is None:
+                yield 0, self.height, 0, self.height
+                return
+            for top in xrange(0, self.height, self.BAND_HEIGHT):
+                bottom = min(top + self.BAND_HEIGHT, self.height)
+                lo = max(top - self.BAND_MARGIN, 0)
+                yield top, bottom, lo, min(bottom + self.BAND_MARGIN, self.height)
+
+        def renderBand(self, lo, hi):
+            scale = 2**self.zooms
+            cr = cairo.Context(self.surface)
+            cr.set_operator(cairo.OPERATOR_CLEAR)
+            cr.paint()
+            cr.set_operator(cairo.OPERATOR_OVER)
+            # Only what's recorded within the band is replayed.
+            cr.rectangle(0, 0, self.width * scale, (hi - lo) * scale)
+            cr.clip()
+            cr.set_source_surface(self.recording, 0, -lo * scale)
+            cr.paint()
+            self.surface.flush()
+
+        def write_to_png(self, path):
+            scale = 2**self.zooms
+            im = PIL.Image.new('RGBA', (self.width, self.height))
+            for top, bottom, lo, hi in self.bands():
+                if self.recording is not None:
+                    self.renderBand(lo, hi)
+                band = PIL.Image.frombuffer('RGBA', (self.surface.get_width(), self.surface.get_height()), self.surface.get_data(), 'raw', 'BGRA', 0, 1)
+                band = band.crop((0, 0, self.width * scale, (hi - lo) * scale))
+                for i in xrange(self.zooms - 1, -1, -1):
+                    band = band.resize((self.width * 2**i, (hi - lo) * 2**i), PIL.Image.BILINEAR)
+                im.paste(band.crop((0, top - lo, self.width, bottom - lo)), (0, top))
+            im.save(path, 'PNG')     # path may also be a file object
+            
+DEFAULT_FONT_OPTIONS = cairo.FontOptions()
+DEFAULT_FONT_OPTIONS.set_antialias(cairo.ANTIALIAS_SUBPIXEL)
+
+def createScaledFont(family, size, slant=cairo.FONT_SLANT_NORMAL, weight=cairo.FONT_WEIGHT_NORMAL):
+    face = cairo.ToyFontFace(family, slant, weight)
+    return cairo.ScaledFont(face, cairo.Matrix(xx=size, yy=size), cairo.Matrix(), DEFAULT_FONT_OPTIONS)
+
+def alignText(cr, scaledFont, align, text, x, y):
+    x_bearing, y_bearing, width, height = scaledFont.text_extents(text)[:4]
+    with saved(cr):
+        cr.set_font_options(DEFAULT_FONT_OPTIONS)
+        cr.set_scaled_font(scaledFont)
+        cr.move_to(x - width * align - x_bearing, y)
+        cr.show_text(text)
+    
+def RenderGraph(mode, resultsByBrand, outPath):
+    # If 1 pixel travels M months horizontally,
+    # it should travel M*pixelAspect logScore points vertically,
+    # and we fix the whole thing inside maxGraphSize.
+    maxGraphSize = (580.0, 380.0)
+    pixelAspect = 0.06   
+    minLogScore = -3
+    minMonth = specdata.monthIndex('Jan-1995')
+
+    # Calculate axis extents and actual graph size.
+    allRibs = list(itertools.chain.from_iterable(resultsByBrand.itervalues()))
+    maxMonth = max([r.month for r in allRibs])
+    months = monthDelta(minMonth, maxMonth)
+    maxLogScore = int(round(math.log(max([r.convertedScore for r in allRibs]), 2)))
+    logScoreRange = maxLogScore - minLogScore
+    pelsPerMonth = min(maxGraphSize[0] / months,
+                       maxGraphSize[1] / logScoreRange * pixelAspect)
+    graphSize = (months * pelsPerMonth, logScoreRange * pelsPerMonth / pixelAspect)
+    
+    # Different shapes that are used on the graph.
+    # Each one starts a new sub-path, so that many can share a path.
+    def circle(cr, x, y):
+        cr.new_sub_path()
+        cr.arc(x, y, 2.5, 0, 2*math.pi)
+
+    def triangle(cr, x, y):
+        x, y = round(x)+.5, round(y)
+        cr.move_to(x-3, y+3)
+        cr.line_to(x, y-3)
+        cr.line_to(x+3, y+3)
+        cr.close_path()
+
+    def square(cr, x, y):
+        x, y = round(x), round(y)
+        cr.rectangle(x-2, y-2, 5, 5)
+        
+    # Brands will be rendered in this order, as separate layers.
+    # That way, we can hide the busiest brands (like Xeon) at the bottom.
+    brandColors = [
+        ('003471', 'Intel Xeon', square, 0),
+        ('0072bc', 'Intel Core', circle, 1),
+        ('ffa080', 'DEC Alpha', circle, 13),
+        ('007236', 'AMD Opteron', square, 6),
+        ('86dce3', 'Intel Pentium', circle, 2),
+        ('a0d49b', 'AMD Phenom', triangle, 7),
+        ('31d100', 'AMD Athlon', circle, 8),
+        ('377dfc', 'Intel Itanium', triangle, 3),
+        ('fdad4f', 'Fujitsu SPARC', triangle, 11),
+        ('f8e400', 'Sun SPARC', circle, 12),
+        ('c1d72f', 'AMD FX', square, 5),
+        ('d59d55', 'MIPS', square, 14),
+        ('03d3ff', 'Intel Celeron', square, 4),
+        ('f198dd', 'IBM POWER', triangle, 9),
+        ('e040de', 'PowerPC', circle, 10),
+        ('947b30', 'HP PA-RISC', circle, 15),
+    ]
+    recognized = set([b[1] for b in brandColors])
+
+    # Create surface and context.
+    w, h = int(graphSize[0] + 40), int(graphSize[1] + 75)
+    if 'PIL' in globals():
+        surface = HQSurface(w, h)
+        cr = surface.cr
+    else:
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+        cr = cairo.Context(surface)
+    cr.set_line_width(1)
+    cr.translate(28, 37)
+    cr.set_source_rgb(1, 1, 1)
+    cr.paint()    
+
+    # Title.
+    mode = mode.lower()
+    fullType = { 'fp': 'Floating-Point', 'int': 'Integer' }[mode]
+    with saved(cr):
+        titleFont = createScaledFont('Arial', 20, weight=cairo.FONT_WEIGHT_BOLD)
+        cr.set_source_rgb(0, 0, 0)
+        alignText(cr, titleFont, .5, 'Single-Threaded %s Performance' % fullType, graphSize[0] / 2 - 10, -19)
+        subTitleFont = createScaledFont('Arial', 11)
+        cr.set_source_rgb(.6, .6, .6)
+        alignText(cr, subTitleFont, .5, u'Based on adjusted SPEC%s\xae results' % mode, graphSize[0] / 2, -5)
+    
+    # Shaded area.
+    with saved(cr):
+        x = round(12 * 9 * pelsPerMonth)
+        cr.set_source_rgb(.98, .98, .98)
+        cr.rectangle(x, 0, round(graphSize[0]) - x, round(graphSize[1]))
+        cr.fill()
+        
+    # Render grid lines.
+    with saved(cr):
+        scoreFont = createScaledFont('Arial', 14)
+        fractionFont = createScaledFont('Arial', 16)
+        cr.set_source_rgb(.9, .9, .9)
+        # Horizontal
+        for rls in range(maxLogScore - minLogScore + 1):
+            y = round(graphSize[1] - rls * pelsPerMonth / pixelAspect)
+            with saved(cr):
+                cr.set_source_rgb(.6, .6, .6)
+                exp = minLogScore + rls
+                if exp >= 0:
+                    label = str(2 ** exp)
+                    f = scoreFont
+                else:
+                    label = { -1: unichr(189), -2: unichr(188) }.get(exp, '')
+                    f = fractionFont
+                alignText(cr, f, 1, label, -6, y + 6)
+            cr.move_to(0, y + .5)
+            cr.rel_line_to(graphSize[0], 0)
+            cr.stroke()
+        # Vertical
+        assert minMonth % 12 == 0
+        for month in range(0, months, 12):
+            x = round(month * pelsPerMonth)
+            cr.move_to(x + .5, 0)
+            cr.rel_line_to(0, graphSize[1])
+            cr.stroke()
+        cr.move_to(round(months * pelsPerMonth) + .5, 0)
+        cr.rel_line_to(0, graphSize[1])
+        cr.stroke()
+        yearFont = createScaledFont('Arial', 13)
+        for month in range(6, months, 12):
+            x = month * pelsPerMonth
+            with saved(cr):
+                cr.set_source_rgb(.6, .6, .6)
+                cr.translate(x, graphSize[1])
+                cr.rotate(-math.pi / 4)
+                alignText(cr, yearFont, 1, str(minMonth // 12 + month / 12), -4, 12)
+
+    # Render each brand as another layer. All the markers of a layer are
+    # added to one path, which is filled once.
+    totalPoints = 0
+    with saved(cr):
+        for color, brand, shape, listOrder in [('808080', None, circle, -1)] + sorted(brandColors):
+            if brand:
+                rib = resultsByBrand[brand]
+            else:
+                rib = itertools.chain.from_iterable([rib for b, rib in resultsByBrand.iteritems() if b not in recognized])
+            cr.set_source_rgb(*[int(color[i:i+2], 16)/255.0 for i in xrange(0, 6, 2)])
+            for r in rib:
+                logScore = math.log(r.convertedScore, 2)
+                x = (monthDelta(minMonth, r.month) - .5) * pelsPerMonth
+                y = (logScore - minLogScore) * pelsPerMonth / pixelAspect
+                if x >= 0 and y >= 0:
+                    totalPoints += 1
+                    shape(cr, x, graphSize[1] - y)
+            cr.fill()
+    print '%d points plotted for SPEC%s' % (totalPoints, mode)
+    
+    # Render legend.
+    with saved(cr):
+        legendFont = createScaledFont('Arial', 11)
+        spacing = 11
+        w, h = 90, spacing * len(brandColors) + 4
+        cr.translate(int(graphSize[0]) - w - 23, int(graphSize[1]) - h - 23)
+        cr.set_source_rgb(1, 1, .98)
+        cr.rectangle(0, 0, w, h)
+        cr.fill()
+        cr.set_source_rgb(.7, .7, .7)
+        cr.rectangle(.5, .5, w, h)
+        cr.stroke()
+        cr.translate(7, 9)
+        for color, brand, shape, listOrder in brandColors:
+            # Icon
+            cr.set_source_rgb(*[int(color[i:i+2], 16)/255.0 for i in xrange(0, 6, 2)])
+            shape(cr, 0, listOrder * spacing - 1)
+            cr.fill()
+            # Text
+            cr.set_source_rgb(0, 0, 0)
+            alignText(cr, legendFont, 0, brand, 6, listOrder * spacing + 3)
+    
+    surface.write_to_png(outPath)
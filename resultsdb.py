@@ -0,0 +1,123 @@
+import collections
+import os
+import sqlite3
+import sys
+import specdata
+from cpus import CPUDatabase
+from fileutil import replaceFile
+
+
+#---------------------------------------------------------
+#  SQLite results database
+#---------------------------------------------------------
+#
+# tests has one row per result: the text fields of summaries.txt, numeric
+# mhz, base and peak (NULL if missing), hwDate as 'YYYY-MM', and the CPU
+# identified the same way as make-graphs.py: brand, model, and cpuMhz, the
+# speed grade the result was grouped into. benchmarks has one row per
+# benchmark, linked to tests by test (the rowid) as well as testID.
+
+SCHEMA = [
+    '''CREATE TABLE tests (
+        id INTEGER PRIMARY KEY,
+        testID TEXT, tester TEXT, machine TEXT, cpu TEXT, mhz REAL,
+        hwAvail TEXT, hwDate TEXT, os TEXT, compiler TEXT, autoParallel TEXT,
+        benchType TEXT, base REAL, peak REAL,
+        brand TEXT, model TEXT, cpuMhz REAL)''',
+    '''CREATE TABLE benchmarks (
+        test INTEGER REFERENCES tests(id),
+        testID TEXT, benchName TEXT, base REAL, peak REAL)''',
+]
+
+# Created after the bulk load, which is faster than updating them per row.
+INDEXES = [
+    'CREATE INDEX tests_testID ON tests (testID)',
+    'CREATE INDEX tests_benchType ON tests (benchType, hwDate)',
+    'CREATE INDEX tests_brand ON tests (brand, model)',
+    'CREATE INDEX tests_model ON tests (model)',
+    'CREATE INDEX tests_hwAvail ON tests (hwAvail)',
+    'CREATE INDEX tests_hwDate ON tests (hwDate)',
+    'CREATE INDEX benchmarks_test ON benchmarks (test)',
+    'CREATE INDEX benchmarks_testID ON benchmarks (testID)',
+    'CREATE INDEX benchmarks_benchName ON benchmarks (benchName)',
+]
+
+# What CPUDatabase.identify needs to know about a result.
+CPUQuery = collections.namedtuple('CPUQuery', 'cpu mhz srec')
+
+def real(value):
+    return None if value != value else value     # NaN -> NULL
+
+def iterTestRows(dataset):
+    tests = dataset.tests
+    records = [tests.record(i) for i in xrange(len(tests))]
+    cpus = CPUDatabase().identifyMany([CPUQuery(srec.cpu, mhz, srec) for srec, mhz in zip(records, tests.mhzValue)])
+    for i, (srec, cpu) in enumerate(zip(records, cpus)):
+        month = tests.hwMonth[i]
+        hwDate = '%04d-%02d' % (month // 12, month % 12 + 1) if month >= 0 else None
+        yield (i + 1, srec.testID, srec.tester, srec.machine, srec.cpu, real(tests.mhzValue[i]),
+               srec.hwAvail, hwDate, srec.os, srec.compiler, srec.autoParallel,
+               srec.benchType, real(tests.baseValue[i]), real(tests.peakValue[i]),
+               cpu.brand, cpu.model, real(cpu.mhz))
+
+def iterBenchmarkRows(dataset):
+    benchmarks = dataset.benchmarks
+    for j in xrange(len(benchmarks)):
+        yield (benchmarks.test[j] + 1, benchmarks.testID[j], benchmarks.benchName[j],
+               real(benchmarks.baseValue[j]), real(benchmarks.peakValue[j]))
+
+def insertRows(conn, sql, rows, batchSize):
+    # One transaction per batch of rows.
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batchSize:
+            with conn:
+                conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        with conn:
+            conn.executemany(sql, batch)
+
+def build(dataset, path, batchSize=5000):
+    # The database is built next to path, then renamed over it, so readers
+    # never see a half-loaded database.
+    tmpPath = path + '.tmp'
+    if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+    conn = sqlite3.connect(tmpPath)
+    conn.text_factory = str         # Some CPU names aren't ASCII
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        for sql in SCHEMA:
+            conn.execute(sql)
+        insertRows(conn, 'INSERT INTO tests VALUES (%s)' % ', '.join(['?'] * 17),
+                   iterTestRows(dataset), batchSize)
+        insertRows(conn, 'INSERT INTO benchmarks VALUES (?, ?, ?, ?, ?)',
+                   iterBenchmarkRows(dataset), batchSize)
+        with conn:
+            for sql in INDEXES:
+                conn.execute(sql)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    replaceFile(tmpPath, path)
+
+def connect(path='results.db'):
+    if not os.path.exists(path):
+        raise IOError('%s not found. Run analyze-pages.py with --sqlite, or resultsdb.py, to create it.' % path)
+    conn = sqlite3.connect(path)
+    conn.text_factory = str
+    return conn
+
+
+#---------------------------------------------------------
+#  Build results.db from summaries.txt & benchmarks.txt
+#---------------------------------------------------------
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'results.db'
+    dataset = specdata.load(os.path.dirname(path) or '.')
+    build(dataset, path)
+    print 'Wrote %d tests and %d benchmarks to %s.' % (len(dataset.tests), len(dataset.benchmarks), path)
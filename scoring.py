@@ -0,0 +1,76 @@
+import numpy
+
+
+#---------------------------------------------------------
+#  Batch scoring in log space
+#---------------------------------------------------------
+#
+# Geometric averages are computed as the exponent of the average log, for
+# all results at once. Unlike multiplying the values together first, this
+# can't overflow or underflow, however many benchmarks are averaged.
+
+def benchmarkMatrix(dataset):
+    # Returns benchRows, where benchRows[i, k] is the row in
+    # dataset.benchmarks of benchmark k (the code of its benchName) in test
+    # i, or -1 if test i doesn't have it. If a test lists a benchmark more
+    # than once, the last row counts.
+    tests, benchmarks = dataset.tests, dataset.benchmarks
+    benchRows = numpy.empty((len(tests), len(benchmarks.benchName.values)), numpy.int32)
+    benchRows.fill(-1)
+    # intp, so that empty columns are still integer indexes.
+    benchRows[numpy.asarray(benchmarks.test, numpy.intp),
+              numpy.asarray(benchmarks.benchName.codes, numpy.intp)] = numpy.arange(len(benchmarks))
+    return benchRows
+
+def geometricMeans(values, present):
+    # Geometric average of the present cells of each row of values. NaN for
+    # rows without any.
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        logs = numpy.where(present, numpy.log(values), 0)
+        return numpy.exp(logs.sum(axis=1) / present.sum(axis=1))
+
+def resultScores(dataset, excluded=[], benchRows=None):
+    # Geometric average of the base values of each test's benchmarks,
+    # leaving out those named in excluded. 1 for a test with no benchmarks.
+    if benchRows is None:
+        benchRows = benchmarkMatrix(dataset)
+    names = dataset.benchmarks.benchName.values
+    present = (benchRows >= 0) & ~numpy.array([name in excluded for name in names] or [False], bool)[:len(names)]
+    values = numpy.asarray(dataset.benchmarks.baseValue, numpy.float64)[benchRows]
+    scores = geometricMeans(values, present)
+    scores[present.sum(axis=1) == 0] = 1
+    return scores
+
+def groupedLogMeans(logs, groups, groupCount):
+    # Average of logs in each group, and the number of values in each.
+    counts = numpy.bincount(groups, minlength=groupCount)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.bincount(groups, logs, minlength=groupCount) / counts, counts
+
+def conversionRatios(scores, cpus, suites, suiteCount=3):
+    # Finds the ratios between consecutive suites (95 -> 2000 -> 2006). For
+    # each CPU with results in both suites, the ratio of its geometric
+    # average scores in each is taken; the geometric average of those is
+    # the conversion ratio. cpus gives a CPU number for each result, and
+    # suites the index of its suite, or -1 to leave it out.
+    #
+    # Returns the ratios between consecutive suites, and the factor that
+    # converts a score of each suite into a score of the last one.
+    use = numpy.flatnonzero(suites >= 0)
+    cpuCount = cpus.max() + 1 if len(cpus) else 0
+    cells = cpus[use] * suiteCount + suites[use]
+    with numpy.errstate(divide='ignore'):
+        logs = numpy.log(scores[use])
+    means, counts = groupedLogMeans(logs, cells, cpuCount * suiteCount)
+    means = means.reshape(cpuCount, suiteCount)
+    counts = counts.reshape(cpuCount, suiteCount)
+    logRatios = []
+    for s in xrange(1, suiteCount):
+        both = (counts[:, s - 1] > 0) & (counts[:, s] > 0)
+        logRatios.append((means[both, s] - means[both, s - 1]).mean() if both.any() else 0.0)
+    ratios = numpy.exp(logRatios)
+    factors = numpy.exp(numpy.cumsum(logRatios[::-1])[::-1].tolist() + [0.0])
+    return ratios, factors
+
+def convertScores(scores, suites, factors):
+    return scores * factors[suites]
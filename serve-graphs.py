@@ -0,0 +1,194 @@
+import BaseHTTPServer
+import collections
+import os
+import re
+import sys
+import time
+import urlparse
+from cStringIO import StringIO
+from optparse import OptionParser
+import graphdata
+
+#---------------------------------------------------------
+#  Serve the reports and graphs over HTTP
+#---------------------------------------------------------
+#
+# Loads the results and identifies their CPUs once, then answers requests
+# for the same files make-graphs.py writes, e.g.:
+#   http://localhost:8080/int_graph.png?from=2000&to=2011-06&brand=Intel+Core,AMD+Phenom
+#   http://localhost:8080/fp_report.txt?exclude=470.lbm
+#   http://localhost:8080/identified_cpus.txt
+# from and to are years or months (YYYY-MM), brand and exclude are
+# comma-separated or repeated. Excluded benchmarks are left out of the
+# scores on top of DISQUALIFIED_BENCHMARKS. Responses are kept in an LRU
+# cache keyed by the request. The results are reloaded, and the cache
+# cleared, when summaries.txt, benchmarks.txt or dataset.bin changes.
+
+INPUTS = ['summaries.txt', 'benchmarks.txt', 'dataset.bin']
+
+class LRUCache:
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries[key] = value       # Now the most recently used
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+def parseMonth(value, last):
+    # 'YYYY' or 'YYYY-MM' -> month index. A year means its last month if
+    # last is set, otherwise its first.
+    m = re.match(r'^(\d{4})(?:-(\d{1,2}))?$', value)
+    if not m or not 1 <= int(m.group(2) or 1) <= 12:
+        raise ValueError('Bad month: %s (expected YYYY or YYYY-MM)' % value)
+    month = int(m.group(2)) if m.group(2) else (12 if last else 1)
+    return int(m.group(1)) * 12 + month - 1
+
+def listParam(query, name):
+    values = []
+    for value in query.get(name, []):
+        values += [v.strip() for v in value.split(',') if v.strip()]
+    return values
+
+class GraphService:
+    def __init__(self, directory='.', cacheSize=64):
+        self.directory = directory
+        self.responses = LRUCache(cacheSize)
+        self.analyses = LRUCache(8)
+        self.stamp = None
+        self.rendergraph = None
+        try:
+            import rendergraph
+            self.rendergraph = rendergraph
+        except ImportError:
+            sys.stderr.write('Pycairo not installed. Serving .txt files only.\n')
+        self.reloadIfChanged()
+
+    def inputStamp(self):
+        stamp = []
+        for fn in INPUTS:
+            try:
+                st = os.stat(os.path.join(self.directory, fn))
+                stamp.append((fn, st.st_size, st.st_mtime))
+            except OSError:
+                pass
+        return stamp
+
+    def reloadIfChanged(self):
+        stamp = self.inputStamp()
+        if stamp == self.stamp:
+            return
+        start = time.time()
+        results = graphdata.loadResults(self.directory)
+        cpudb = graphdata.openCPUDatabase(self.directory)
+        cpus, cpuNumbers = graphdata.identifyResults(results, cpudb)
+        cpudb.names.save()
+        self.results, self.cpudb, self.cpus, self.cpuNumbers = results, cpudb, cpus, cpuNumbers
+        self.stamp = stamp
+        self.responses.clear()
+        self.analyses.clear()
+        sys.stderr.write('Loaded %d results in %.2f s\n' % (len(results), time.time() - start))
+
+    def analysis(self, mode, excluded):
+        key = (mode, excluded)
+        analysis = self.analyses.get(key)
+        if analysis is None:
+            results = self.results
+            if excluded:
+                results = graphdata.scoreResults(results.dataset, graphdata.DISQUALIFIED_BENCHMARKS + list(excluded))
+            analysis = graphdata.analyzeMode(mode, results, self.cpus, self.cpuNumbers)
+            self.analyses.put(key, analysis)
+        return analysis
+
+    def captured(self, func, *args):
+        # Whatever func prints, as a string.
+        saveStdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            func(*args)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = saveStdout
+
+    def respond(self, path, query):
+        # Returns (HTTP status, content type, body).
+        self.reloadIfChanged()
+        m = re.match(r'^/(?:(identified_cpus)\.txt|(int|fp)_(report\.txt|graph\.png))$', path)
+        if not m:
+            return 404, 'text/plain', 'Not found. Try /int_graph.png, /fp_report.txt or /identified_cpus.txt.\n'
+        loMonth = parseMonth(query['from'][-1], False) if 'from' in query else None
+        hiMonth = parseMonth(query['to'][-1], True) if 'to' in query else None
+        brands = tuple(sorted(listParam(query, 'brand'))) or None
+        excluded = tuple(sorted(listParam(query, 'exclude')))
+        key = (path, loMonth, hiMonth, brands, excluded)
+        response = self.responses.get(key)
+        if response is None:
+            if m.group(1):
+                response = 200, 'text/plain', self.captured(graphdata.printIdentifiedCPUs, self.results, self.cpus, self.cpudb)
+            else:
+                mode = m.group(2).upper()
+                analysis = graphdata.filterAnalysis(self.analysis(mode, excluded), loMonth, hiMonth, brands)
+                if m.group(3) == 'report.txt':
+                    response = 200, 'text/plain', self.captured(graphdata.printReport, analysis)
+                elif self.rendergraph is None:
+                    response = 404, 'text/plain', 'Pycairo is not installed.\n'
+                elif not analysis.resultsByBrand:
+                    response = 404, 'text/plain', 'No results match.\n'
+                else:
+                    out = StringIO()
+                    self.rendergraph.RenderGraph(mode, analysis.resultsByBrand, out)
+                    response = 200, 'image/png', out.getvalue()
+            self.responses.put(key, response)
+        return response
+
+class GraphRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = time.time()
+        url = urlparse.urlparse(self.path)
+        try:
+            status, contentType, body = self.server.service.respond(url.path, urlparse.parse_qs(url.query))
+        except ValueError, e:
+            status, contentType, body = 400, 'text/plain', '%s\n' % e
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.log_message('"%s" %d, %.1f ms', self.path, status, (time.time() - start) * 1000)
+
+    def log_request(self, code='-', size='-'):
+        pass        # do_GET logs the time taken instead
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('--host', default='127.0.0.1',
+                      help='address to listen on [default: %default]')
+    parser.add_option('-p', '--port', type='int', default=8080,
+                      help='port to listen on [default: %default]')
+    parser.add_option('--cache', type='int', default=64,
+                      help='number of responses to keep [default: %default]')
+    options, args = parser.parse_args()
+
+    server = BaseHTTPServer.HTTPServer((options.host, options.port), GraphRequestHandler)
+    server.service = GraphService(cacheSize=options.cache)
+    print 'Serving on http://%s:%d/' % server.server_address
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,285 @@
+import array
+import collections
+import csv
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+from fileutil import replaceFile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#---------------------------------------------------------
+#  Records, as found in summaries.txt and benchmarks.txt
+#---------------------------------------------------------
+
+SummaryRecord = collections.namedtuple('SummaryRecord', 'testID tester machine cpu mhz hwAvail os compiler autoParallel benchType base peak')
+BenchmarkRecord = collections.namedtuple('BenchmarkRecord', 'testID benchName base peak')
+
+NAN = float('nan')
+
+def parseFloat(text):
+    try:
+        return float(text)
+    except ValueError:
+        return NAN
+
+def monthIndex(hwAvail):
+    # 'Mar-2011' -> 2011 * 12 + 2, or -1 if it can't be parsed.
+    try:
+        d = datetime.datetime.strptime(hwAvail, '%b-%Y')
+    except ValueError:
+        return -1
+    return d.year * 12 + d.month - 1
+
+def monthDate(index):
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+#---------------------------------------------------------
+#  Columns and tables
+#---------------------------------------------------------
+
+class DictColumn:
+    # A dictionary-encoded string column: an integer code per row, and the
+    # list of distinct values.
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        values = self.values
+        for code in self.codes:
+            yield values[code]
+
+class DictEncoder:
+    def __init__(self):
+        self.codes = array.array('i')
+        self.lookup = {}
+        self.values = []
+
+    def append(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def column(self):
+        return DictColumn(self.codes, self.values)
+
+class Table:
+    # Columns are accessed as attributes, e.g. tests.mhzValue[i]. The
+    # original text fields of row i are returned by record(i).
+    def __init__(self, recordClass, columns):
+        self.recordClass = recordClass
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[self.recordClass._fields[0]])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def record(self, i):
+        return self.recordClass._make([self.columns[f][i] for f in self.recordClass._fields])
+
+class Dataset:
+    # tests: one row per result, with the SummaryRecord text fields plus
+    #     mhzValue, baseValue, peakValue (float), hwMonth (int, see
+    #     monthIndex), and benchStart, benchCount: the test's rows in
+    #     benchmarks.
+    # benchmarks: one row per benchmark, with the BenchmarkRecord text
+    #     fields plus test (row in tests), baseValue and peakValue.
+    def __init__(self, tests, benchmarks):
+        self.tests = tests
+        self.benchmarks = benchmarks
+
+    def benchRange(self, i):
+        start = self.tests.benchStart[i]
+        return xrange(start, start + self.tests.benchCount[i])
+
+
+#---------------------------------------------------------
+#  Reading summaries.txt & benchmarks.txt
+#---------------------------------------------------------
+
+def iterCsvRows(path, fields):
+    # Yields each row as a list in the order of fields.
+    with open(path, 'rb') as f:
+        reader = csv.reader(f)
+        header = reader.next()
+        order = [header.index(field) for field in fields]
+        for row in reader:
+            yield [row[i] for i in order]
+
+def readCsv(summariesPath='summaries.txt', benchmarksPath='benchmarks.txt'):
+    encoders = [DictEncoder() for f in SummaryRecord._fields]
+    testRows = collections.defaultdict(list)
+    for i, row in enumerate(iterCsvRows(summariesPath, SummaryRecord._fields)):
+        testRows[row[0]].append(i)
+        for encoder, value in zip(encoders, row):
+            encoder.append(value)
+    tests = dict(zip(SummaryRecord._fields, [e.column() for e in encoders]))
+    for name in ['mhz', 'base', 'peak']:
+        values = map(parseFloat, tests[name].values)
+        tests[name + 'Value'] = array.array('d', [values[c] for c in tests[name].codes])
+    months = map(monthIndex, tests['hwAvail'].values)
+    tests['hwMonth'] = array.array('i', [months[c] for c in tests['hwAvail'].codes])
+
+    # Benchmark rows are grouped by test, in the order of summaries.txt.
+    # If a testID appears more than once, each of its tests gets its own
+    # copy of all of its benchmarks.
+    rows = [(test, i, row) for i, row in enumerate(iterCsvRows(benchmarksPath, BenchmarkRecord._fields))
+            for test in testRows.get(row[0], [])]
+    rows.sort()
+    encoders = [DictEncoder() for f in BenchmarkRecord._fields]
+    benchTest = array.array('i')
+    benchCount = array.array('i', [0] * len(tests['testID']))
+    for test, i, row in rows:
+        benchTest.append(test)
+        benchCount[test] += 1
+        for encoder, value in zip(encoders, row):
+            encoder.append(value)
+    benchmarks = dict(zip(BenchmarkRecord._fields, [e.column() for e in encoders]))
+    benchmarks['test'] = benchTest
+    for name in ['base', 'peak']:
+        values = map(parseFloat, benchmarks[name].values)
+        benchmarks[name + 'Value'] = array.array('d', [values[c] for c in benchmarks[name].codes])
+    benchStart = array.array('i')
+    start = 0
+    for count in benchCount:
+        benchStart.append(start)
+        start += count
+    tests['benchStart'] = benchStart
+    tests['benchCount'] = benchCount
+    return Dataset(Table(SummaryRecord, tests), Table(BenchmarkRecord, benchmarks))
+
+
+#---------------------------------------------------------
+#  Columnar binary format
+#---------------------------------------------------------
+#
+# 'SPECDATA', a little-endian uint32 header length, then a JSON header
+# giving the row count of each table, and the offset of each column's data.
+# Numeric columns are raw arrays of int32 ('i') or float64 ('d'). Dictionary
+# columns are an int32 code array, plus their values joined by NUL bytes.
+# Every array starts on an 8-byte boundary, so the file can be mapped
+# straight into numpy arrays.
+
+MAGIC = 'SPECDATA'
+TABLES = [('tests', SummaryRecord), ('benchmarks', BenchmarkRecord)]
+
+def align(n):
+    return (n + 7) & ~7
+
+def save(dataset, path):
+    blobs = []
+    offset = [0]
+    def addBlob(data):
+        start = offset[0]
+        blobs.append(data + '\0' * (align(len(data)) - len(data)))
+        offset[0] += align(len(data))
+        return start
+
+    header = {'version': 1, 'byteorder': sys.byteorder, 'tables': {}}
+    for tableName, recordClass in TABLES:
+        table = getattr(dataset, tableName)
+        columns = {}
+        for name, column in sorted(table.columns.iteritems()):
+            if isinstance(column, DictColumn):
+                values = '\0'.join(column.values)
+                columns[name] = {'kind': 'dict', 'type': column.codes.typecode,
+                                 'offset': addBlob(column.codes.tostring()),
+                                 'valuesOffset': addBlob(values),
+                                 'valuesLength': len(values),
+                                 'valuesCount': len(column.values)}
+            else:
+                columns[name] = {'kind': 'array', 'type': column.typecode,
+                                 'offset': addBlob(column.tostring())}
+        header['tables'][tableName] = {'rows': len(table), 'columns': columns}
+
+    headerText = json.dumps(header, sort_keys=True)
+    dataStart = align(len(MAGIC) + 4 + len(headerText))
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(headerText)) + headerText)
+        f.write('\0' * (dataStart - f.tell()))
+        for blob in blobs:
+            f.write(blob)
+    replaceFile(path + '.tmp', path)
+
+def loadBinary(path, mapped=False):
+    # With mapped=True and numpy installed, numeric columns and codes are
+    # read-only numpy arrays over a memory map of the file. Otherwise they
+    # are array.arrays, each filled with one bulk copy.
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError('%s is not a dataset file' % path)
+    headerLength, = struct.unpack('<I', mm[len(MAGIC):len(MAGIC) + 4])
+    header = json.loads(mm[len(MAGIC) + 4:len(MAGIC) + 4 + headerLength])
+    dataStart = align(len(MAGIC) + 4 + headerLength)
+    swap = header['byteorder'] != sys.byteorder
+    useNumpy = mapped and numpy is not None and not swap
+
+    def readArray(typecode, offset, count):
+        offset += dataStart
+        if useNumpy:
+            return numpy.frombuffer(mm, numpy.dtype(typecode), count, offset)
+        a = array.array(str(typecode))
+        a.fromstring(mm[offset:offset + count * a.itemsize])
+        if swap:
+            a.byteswap()
+        return a
+
+    tables = {}
+    for tableName, recordClass in TABLES:
+        info = header['tables'][tableName]
+        columns = {}
+        for name, c in info['columns'].iteritems():
+            data = readArray(c['type'], c['offset'], info['rows'])
+            if c['kind'] == 'dict':
+                start = dataStart + c['valuesOffset']
+                values = mm[start:start + c['valuesLength']].split('\0') if c['valuesCount'] else []
+                data = DictColumn(data, values)
+            columns[str(name)] = data
+        tables[tableName] = Table(recordClass, columns)
+    return Dataset(tables['tests'], tables['benchmarks'])
+
+def load(directory='.', mapped=False):
+    # Loads dataset.bin, unless it's missing or older than the CSV files,
+    # such as when they were downloaded rather than produced by
+    # analyze-pages.py. Then the CSV files are read instead.
+    binPath = os.path.join(directory, 'dataset.bin')
+    csvPaths = [os.path.join(directory, 'summaries.txt'), os.path.join(directory, 'benchmarks.txt')]
+    if os.path.exists(binPath):
+        binTime = os.path.getmtime(binPath)
+        if all([not os.path.exists(p) or os.path.getmtime(p) <= binTime for p in csvPaths]):
+            return loadBinary(binPath, mapped)
+    return readCsv(*csvPaths)
+
+
+#---------------------------------------------------------
+#  Convert summaries.txt & benchmarks.txt to dataset.bin
+#---------------------------------------------------------
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    dataset = readCsv(os.path.join(directory, 'summaries.txt'), os.path.join(directory, 'benchmarks.txt'))
+    save(dataset, os.path.join(directory, 'dataset.bin'))
+    print 'Wrote %d tests and %d benchmarks to dataset.bin.' % (len(dataset.tests), len(dataset.benchmarks))
@@ -0,0 +1,51 @@
+import imp
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pagestore import PageStore
+
+analyzePages = imp.load_source('analyzepages', os.path.join(ROOT, 'analyze-pages.py'))
+
+WITHDRAWN_PAGE = '''\
+                           SPEC CINT2000 Summary
+          Example Corp. Example Server 1000 (1000 MHz)
+SPEC has determined that this result was not in
+compliance with the SPEC run rules, and has withdrawn it.
+'''
+
+class ParseResultPageTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.saveStore = analyzePages.STORE
+        analyzePages.STORE = PageStore(self.root)
+
+    def tearDown(self):
+        analyzePages.STORE.close()
+        analyzePages.STORE = self.saveStore
+        shutil.rmtree(self.root)
+
+    def parse(self, suite, data):
+        path = suite + '/test-00001.txt'
+        analyzePages.STORE.write(path, data)
+        return analyzePages.parseResultPage(suite, path)
+
+    def testRejectedWithoutSeparator(self):
+        self.assertEqual(self.parse('cpu2000', WITHDRAWN_PAGE), ([], []))
+        self.assertEqual(self.parse('cpu95', WITHDRAWN_PAGE), ([], []))
+
+    def testMissingSeparatorIsSkipped(self):
+        saveStderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            self.assertEqual(self.parse('cpu95', 'Not a result page\n'), ([], []))
+        finally:
+            sys.stderr.close()
+            sys.stderr = saveStderr
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import collections
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import cpus
+
+FakeSummary = collections.namedtuple('FakeSummary', 'machine')
+FakeResult = collections.namedtuple('FakeResult', 'cpu mhz srec')
+
+def fakeResults(speeds):
+    return [FakeResult('Intel Pentium 4 %d MHz' % mhz, float(mhz), FakeSummary('Example Server'))
+            for mhz in speeds]
+
+class SpeedGroupTest(unittest.TestCase):
+    def checkAgreement(self, speeds):
+        for order in [speeds, speeds[::-1]]:
+            results = fakeResults(order)
+            cpudb = cpus.CPUDatabase()
+            grouped = cpudb.identifyMany(results)
+            self.assertEqual([cpudb.identify(r) for r in results], grouped)
+
+    def testIdentifyAgreesWithIdentifyMany(self):
+        self.checkAgreement([1000, 1049, 1051])
+        self.checkAgreement([1000, 1030, 1049, 1051, 1080, 1100, 1104, 2000])
+
+    def testSweepJoinsTheGroupBelow(self):
+        cpudb = cpus.CPUDatabase()
+        grouped = cpudb.identifyMany(fakeResults([1051, 1049, 1000]))
+        self.assertEqual([cpu.mhz for cpu in grouped], [1051, 1000, 1000])
+
+if __name__ == '__main__':
+    unittest.main()
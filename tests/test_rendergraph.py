@@ -0,0 +1,83 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import cairo
+    import PIL.Image
+    import PIL.ImageChops
+    import rendergraph
+except ImportError:
+    rendergraph = None
+
+class FullHQSurface:
+    # HQSurface as it was before banding: one supersampled surface for the
+    # whole image.
+    def __init__(self, width, height, zooms=2):
+        self.width, self.height = width, height
+        self.zooms = zooms
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width * 2**zooms, height * 2**zooms)
+        cr = self.cr = cairo.Context(self.surface)
+        if zooms > 0:
+            cr.scale(2.0, 2.0)
+            cr.translate(0.5, 0.5)
+        for i in xrange(1, zooms):
+            cr.scale(2.0, 2.0)
+
+    def write_to_png(self, path):
+        self.surface.flush()
+        im = PIL.Image.frombuffer('RGBA', (self.surface.get_width(), self.surface.get_height()), self.surface.get_data(), 'raw', 'BGRA', 0, 1)
+        for i in xrange(self.zooms - 1, -1, -1):
+            im = im.resize((self.width * 2**i, self.height * 2**i), PIL.Image.BILINEAR)
+        im.save(path, 'PNG')
+
+def drawScene(surface):
+    # Shapes and text crossing band boundaries, like a graph.
+    cr = surface.cr
+    cr.set_source_rgb(1, 1, 1)
+    cr.paint()
+    cr.set_line_width(0.8)
+    for i in xrange(12):
+        cr.set_source_rgb(i / 12.0, 0.3, 1 - i / 12.0)
+        cr.arc(20 + i * 23, 15 + i * 13, 6, 0, 6.2832)
+        cr.fill()
+        cr.move_to(0, 10.5 + i * 15)
+        cr.line_to(300, 20.5 + i * 15)
+        cr.stroke()
+    font = rendergraph.createScaledFont('Arial', 13)
+    cr.set_source_rgb(0, 0, 0)
+    for i, text in enumerate(['Single-Threaded Integer Performance', 'Intel Xeon', '1995 1996 1997 1998']):
+        rendergraph.alignText(cr, font, 0.5, text, 150, 31 + i * 67)
+
+@unittest.skipIf(rendergraph is None or not hasattr(rendergraph, 'HQSurface'), 'needs pycairo and PIL')
+class HQSurfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def render(self, surfaceClass, name):
+        surface = surfaceClass(300, 200)
+        drawScene(surface)
+        path = os.path.join(self.root, name)
+        surface.write_to_png(path)
+        return PIL.Image.open(path).convert('RGBA')
+
+    def testMatchesFullSizeRender(self):
+        banded = self.render(rendergraph.HQSurface, 'banded.png')
+        full = self.render(FullHQSurface, 'full.png')
+        self.assertEqual(banded.size, full.size)
+        # Subpixel antialiased text goes through the recording slightly
+        # differently, so a few pixels of glyph stems may be off by a little.
+        diff = PIL.ImageChops.difference(banded, full).convert('RGB')
+        self.assertTrue(max([hi for lo, hi in diff.getextrema()]) <= 16, diff.getextrema())
+        offPixels = sum(diff.convert('L').point(lambda v: 255 if v > 2 else 0).histogram()[255:])
+        self.assertTrue(offPixels < banded.size[0] * banded.size[1] // 1000, offPixels)
+
+if __name__ == '__main__':
+    unittest.main()
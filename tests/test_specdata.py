@@ -0,0 +1,46 @@
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import specdata
+
+def writeCsv(path, recordClass, rows):
+    with open(path, 'wb') as f:
+        w = csv.writer(f)
+        w.writerow(recordClass._fields)
+        for row in rows:
+            w.writerow(recordClass._make(row))
+
+class DuplicateTestIDTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        summary = ['Example Corp.', 'Server 1000', 'Example CPU 1000MHz', '1000', 'Mar-2001',
+                   'Example OS', 'Example C', 'No', 'CINT2000', '400', '450']
+        writeCsv(os.path.join(self.root, 'summaries.txt'), specdata.SummaryRecord,
+                 [['t1'] + summary, ['t2'] + summary, ['t1'] + summary])
+        writeCsv(os.path.join(self.root, 'benchmarks.txt'), specdata.BenchmarkRecord,
+                 [['t1', '164.gzip', '200', '210'], ['t2', '164.gzip', '300', '310'],
+                  ['t1', '175.vpr', '800', '820']])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def testEveryCopyGetsAllBenchmarks(self):
+        dataset = specdata.readCsv(os.path.join(self.root, 'summaries.txt'),
+                                   os.path.join(self.root, 'benchmarks.txt'))
+        binPath = os.path.join(self.root, 'dataset.bin')
+        specdata.save(dataset, binPath)
+        for dataset in [dataset, specdata.loadBinary(binPath)]:
+            benches = [[dataset.benchmarks.record(j) for j in dataset.benchRange(i)] for i in xrange(3)]
+            self.assertEqual([b.benchName for b in benches[0]], ['164.gzip', '175.vpr'])
+            self.assertEqual(benches[2], benches[0])
+            self.assertEqual([b.base for b in benches[1]], ['300'])
+            self.assertEqual(list(dataset.benchmarks.test), [0, 0, 1, 2, 2])
+
+if __name__ == '__main__':
+    unittest.main()